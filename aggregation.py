@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Agrégation temporelle en périodes représentatives.
+
+Les jours (ou semaines) de la fenêtre simulée sont regroupés en N périodes
+représentatives à partir des profils de demande et des facteurs de charge
+(k-means, k-medoids ou classification hiérarchique). Seules ces périodes sont
+optimisées, chacune pondérée par le nombre de périodes qu'elle représente.
+
+Pour garder un état de charge cohérent sur toute la fenêtre, le stockage
+suit la formulation par superposition de Kotzur et al. (2018) : un état de
+charge intra-période (qui part de 0 au début de chaque période
+représentative) et un état de charge inter-période, défini pour chaque
+période d'origine et relié d'une période à la suivante. Les résultats sont
+ensuite ré-étendus sur la fenêtre complète.
+
+Les contraintes de temps minimal de marche/arrêt et de rampe sont appliquées
+sur la suite des périodes représentatives : l'agrégation est destinée au
+criblage de scénarios, compare_aggregation donne l'écart à l'horizon glissant
+sur la même période (référence faisable sur une année complète).
+Mesuré sur l'année 2025 (HiGHS, référence en 349 s) : 12 jours types
+résolus 22 fois plus vite, mais avec 15 % d'écart sur le coût et 20 % sur le
+CO2 ; à 24, 48 et 96 jours, l'écart sur le CO2 descend à 3 %, 2 % et 0,5 %,
+le coût restant à 9-20 % et le gain de temps tombant à x3,6, x1,4 et x0,2.
+Le gain d'un ordre de grandeur à erreur bornée n'est donc pas atteint.
+
+Exemple :
+    python aggregation.py --horizon 8760 --periods 12 24 48 --solver highs
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import xarray as xr
+from main import prep_network
+from monte_carlo import DEFAULT_VOLL
+from rolling_horizon import optimize_rolling_horizon
+
+
+def period_profiles(network, period_hours=24):
+    # une ligne par période, les heures de chaque série normalisée en colonnes
+    profiles = pd.concat([network.loads_t.p_set.sum(axis=1).rename("demand"),
+                          network.generators_t.p_max_pu], axis=1)
+    n_periods = len(profiles) // period_hours
+    if n_periods*period_hours != len(profiles):
+        raise ValueError("La durée simulée doit être un multiple de period_hours.")
+    scale = profiles.abs().max().replace(0, 1)
+    features = (profiles/scale).values.reshape(n_periods, period_hours*profiles.shape[1])
+    return profiles, features
+
+
+def _medoids(features, labels):
+    # en distance euclidienne au carré, le point le plus proche du centre du
+    # groupe est aussi celui qui minimise la somme des distances aux autres
+    medoids = []
+    for k in np.unique(labels):
+        members = np.flatnonzero(labels == k)
+        centre = features[members].mean(axis=0)
+        medoids.append(members[np.argmin(((features[members] - centre)**2).sum(axis=1))])
+    return np.array(medoids)
+
+
+def cluster_periods(features, n_clusters, method="kmedoids", seed=0):
+    from scipy.cluster.hierarchy import fcluster, linkage
+    from scipy.cluster.vq import kmeans2
+
+    n_clusters = min(n_clusters, len(features))
+    if method == "hierarchical":
+        labels = fcluster(linkage(features, method="ward"), n_clusters, criterion="maxclust")
+    elif method in ("kmeans", "kmedoids"):
+        _, labels = kmeans2(features, n_clusters, seed=seed, minit="++")
+    else:
+        raise ValueError("Méthode inconnue : " + method)
+
+    if method == "kmedoids":
+        # réaffectation au médoïde le plus proche jusqu'à stabilité
+        for _ in range(50):
+            medoids = _medoids(features, labels)
+            distances = ((features[:, None, :] - features[medoids][None, :, :])**2).sum(axis=2)
+            new_labels = distances.argmin(axis=1)
+            if np.array_equal(new_labels, np.unique(labels, return_inverse=True)[1]):
+                break
+            labels = new_labels
+
+    # étiquettes 0..K-1 dans l'ordre chronologique des médoïdes
+    medoids = _medoids(features, labels)
+    order = np.argsort(medoids)
+    assignment = np.empty(len(features), dtype=int)
+    for new, k in enumerate(np.unique(labels)[order]):
+        assignment[labels == k] = new
+    return assignment, medoids[order]
+
+
+class AggregatedNetwork:
+
+    def __init__(self, time_horizon_in_hours, date_debut, demand_multiplier, climatic_data_year, clim_year,
+                 capa_data_year, p_bat, capa_bat, p_hyd, capa_hyd, charge_initiale_stockage,
+                 n_periods=12, period_hours=24, method="kmedoids", seed=0, commitment_window=None, voll=None):
+        # commitment_window : durée de référence des temps minimaux d'arrêt,
+        # par défaut la suite des périodes représentatives
+        self.period_hours = period_hours
+        self.full_network = prep_network(time_horizon_in_hours, date_debut, demand_multiplier, climatic_data_year,
+                                         clim_year, capa_data_year, p_bat, capa_bat, p_hyd, capa_hyd,
+                                         charge_initiale_stockage,
+                                         commitment_window=commitment_window or n_periods*period_hours, voll=voll)
+        profiles, features = period_profiles(self.full_network, period_hours)
+        self.assignment, medoids = cluster_periods(features, n_periods, method, seed)
+        self.counts = np.bincount(self.assignment)
+        n_rep = len(medoids)
+
+        # réseau réduit : les heures des périodes représentatives, mises bout à bout
+        hours = (medoids[:, None]*period_hours + np.arange(period_hours)).ravel()
+        snapshots = self.full_network.snapshots[hours]
+        self.network = self.full_network.copy(snapshots=snapshots)
+        if method == "kmeans":
+            # centroïdes : moyenne des périodes de chaque groupe
+            values = profiles.values.reshape(len(self.assignment), period_hours, -1)
+            centroids = np.stack([values[self.assignment == k].mean(axis=0) for k in range(n_rep)])
+            centroids = pd.DataFrame(centroids.reshape(n_rep*period_hours, -1), index=snapshots,
+                                     columns=profiles.columns)
+            self.network.generators_t.p_max_pu = centroids[self.network.generators_t.p_max_pu.columns]
+            share = self.network.loads_t.p_set.div(self.network.loads_t.p_set.sum(axis=1), axis=0).fillna(0)
+            self.network.loads_t.p_set = share.mul(centroids["demand"], axis=0)
+
+        weights = np.repeat(self.counts, period_hours).astype(float)
+        self.network.snapshot_weightings.loc[:, "objective"] = weights
+        self.network.snapshot_weightings.loc[:, "generators"] = weights
+        # le bilan des stockages est réécrit heure par heure dans _storage_coupling
+        self.network.snapshot_weightings.loc[:, "stores"] = 1.0
+
+        # erreur de représentation des profils (RMSE relative par série)
+        rep_values = self.network.loads_t.p_set.sum(axis=1).rename("demand").to_frame().join(
+            self.network.generators_t.p_max_pu).values.reshape(n_rep, period_hours, -1)
+        expanded = rep_values[self.assignment].reshape(len(profiles), -1)
+        rmse = np.sqrt(((expanded - profiles.values)**2).mean(axis=0))
+        self.profile_error = pd.Series(rmse/profiles.abs().mean().replace(0, 1).values, index=profiles.columns)
+
+    def _storage_coupling(self, n, sns):
+        m = n.model
+        su = n.storage_units
+        names = su.index.rename("StorageUnit")
+        period_hours = self.period_hours
+        n_rep = len(self.counts)
+        n_orig = len(self.assignment)
+
+        soc = m["StorageUnit-state_of_charge"]
+        p_store = m["StorageUnit-p_store"]
+        p_dispatch = m["StorageUnit-p_dispatch"]
+        for name in ("StorageUnit-energy_balance", "StorageUnit-fix-state_of_charge-lower",
+                     "StorageUnit-fix-state_of_charge-upper"):
+            if name in m.constraints:
+                m.remove_constraints(name)
+
+        # bilan intra-période : l'état de charge repart de 0 à chaque période représentative
+        not_first_hour = xr.DataArray(np.arange(len(sns)) % period_hours != 0, coords={"snapshot": sns})
+        eff_store = xr.DataArray(su.efficiency_store.reindex(names))
+        eff_dispatch = xr.DataArray(su.efficiency_dispatch.reindex(names))
+        previous = soc.shift(snapshot=1).where(not_first_hour)
+        m.add_constraints(soc - previous - eff_store*p_store + p_dispatch/eff_dispatch == 0,
+                          name="StorageUnit-intra_energy_balance")
+
+        rep = pd.RangeIndex(n_rep, name="rep")
+        # état de charge aux frontières entre périodes d'origine (n_orig + 1 valeurs)
+        boundaries = pd.RangeIndex(n_orig + 1, name="boundary")
+        intra_max = m.add_variables(lower=0, coords=[rep, names], name="StorageUnit-intra_soc_max")
+        intra_min = m.add_variables(upper=0, coords=[rep, names], name="StorageUnit-intra_soc_min")
+        inter = m.add_variables(lower=0, coords=[boundaries, names], name="StorageUnit-inter_soc")
+
+        rep_of_hour = xr.DataArray(np.repeat(np.arange(n_rep), period_hours), coords={"snapshot": sns})
+        m.add_constraints(soc - intra_max.isel(rep=rep_of_hour) <= 0, name="StorageUnit-intra_soc_max")
+        m.add_constraints(soc - intra_min.isel(rep=rep_of_hour) >= 0, name="StorageUnit-intra_soc_min")
+
+        # état de charge au début de chaque période d'origine
+        orig = pd.RangeIndex(n_orig, name="period")
+        rep_of_period = xr.DataArray(self.assignment, coords={"period": orig})
+        last_hour = xr.DataArray(self.assignment*period_hours + period_hours - 1, coords={"period": orig})
+        following = inter.isel(boundary=xr.DataArray(np.arange(1, n_orig + 1), coords={"period": orig}))
+        current = inter.isel(boundary=xr.DataArray(np.arange(n_orig), coords={"period": orig}))
+        m.add_constraints(following - current - soc.isel(snapshot=last_hour) == 0,
+                          name="StorageUnit-inter_energy_balance")
+
+        capacity = xr.DataArray((su.p_nom*su.max_hours).reindex(names))
+        m.add_constraints(current + intra_max.isel(rep=rep_of_period) <= capacity, name="StorageUnit-inter_soc_upper")
+        m.add_constraints(current + intra_min.isel(rep=rep_of_period) >= 0, name="StorageUnit-inter_soc_lower")
+        m.add_constraints(inter.isel(boundary=n_orig) <= capacity, name="StorageUnit-inter_soc_final")
+
+        cyclic = su.cyclic_state_of_charge.reindex(names)
+        start = inter.isel(boundary=0)
+        if cyclic.any():
+            m.add_constraints(start.sel(StorageUnit=names[cyclic]) - inter.isel(boundary=n_orig).sel(StorageUnit=names[cyclic]) == 0,
+                              name="StorageUnit-inter_soc_cyclic")
+        if (~cyclic).any():
+            initial = xr.DataArray(su.state_of_charge_initial.reindex(names[~cyclic]))
+            m.add_constraints(start.sel(StorageUnit=names[~cyclic]) == initial, name="StorageUnit-inter_soc_initial")
+
+    def optimize(self, solver_name="cbc", **kwargs):
+        return self.network.optimize(solver_name=solver_name, extra_functionality=self._storage_coupling, **kwargs)
+
+    def expand(self):
+        # résultats ré-étendus sur la fenêtre complète (une copie du réseau d'origine)
+        full = self.full_network.copy()
+        hours = (self.assignment[:, None]*self.period_hours + np.arange(self.period_hours)).ravel()
+        for component, attrs in (("generators_t", ("p", "status")), ("storage_units_t", ("p", "p_dispatch", "p_store")),
+                                 ("loads_t", ("p",)), ("buses_t", ("p", "marginal_price"))):
+            source, target = getattr(self.network, component), getattr(full, component)
+            for attr in attrs:
+                if attr in source and not source[attr].empty:
+                    target[attr] = pd.DataFrame(source[attr].values[hours], index=full.snapshots,
+                                                columns=source[attr].columns)
+
+        # état de charge = inter-période au début de la période + intra-période
+        inter = self.network.model.solution["StorageUnit-inter_soc"].to_pandas().iloc[:-1]
+        intra = self.network.storage_units_t.state_of_charge.values[hours]
+        full.storage_units_t.state_of_charge = pd.DataFrame(
+            np.repeat(inter.values, self.period_hours, axis=0) + intra, index=full.snapshots, columns=inter.columns)
+        # objectif posé comme le fait solve_model (le setter public est déprécié)
+        full._objective, full._objective_constant = self.network.objective, self.network.objective_constant
+        return full
+
+
+def rolling_reference(params, solver_name="cbc", horizon=168, overlap=24, voll=DEFAULT_VOLL, **kwargs):
+    # (réseau, statut, durée) de l'horizon glissant, calculé une fois pour plusieurs agrégations
+    t0 = time.perf_counter()
+    network = prep_network(**params, commitment_window=horizon, voll=voll)
+    status = optimize_rolling_horizon(network, horizon=horizon, overlap=overlap, solver_name=solver_name, **kwargs)
+    return network, status, time.perf_counter() - t0
+
+
+def compare_aggregation(params, n_periods=12, period_hours=24, method="kmedoids", solver_name="cbc", horizon=168,
+                        overlap=24, voll=DEFAULT_VOLL, reference=None, **kwargs):
+    # écart sur le CO2 et le coût entre la référence et le calcul agrégé. La référence est l'horizon
+    # glissant (fenêtres de horizon heures) : une résolution d'un seul tenant à pleine résolution n'est
+    # plus faisable au-delà d'un mois environ, les temps minimaux d'arrêt suivant la fenêtre. Les deux
+    # calculs partagent la même durée de référence des temps minimaux d'arrêt et le délestage au coût
+    # voll, sans lequel certaines semaines de l'année sont infaisables (cf. monte_carlo.py).
+    def co2(network):
+        co2_list = network.generators.carrier.map(network.carriers.co2_emissions)
+        return float((network.generators_t.p*co2_list).sum(axis=1).mul(network.snapshot_weightings.generators).sum())
+
+    def cost(network):
+        # coût de production, compté de la même façon dans les deux calculs
+        return float((network.generators_t.p*network.generators.marginal_cost).sum(axis=1)
+                     .mul(network.snapshot_weightings.objective).sum())
+
+    full, full_status, full_time = reference or rolling_reference(params, solver_name, horizon, overlap, voll, **kwargs)
+
+    t0 = time.perf_counter()
+    agg = AggregatedNetwork(**params, n_periods=n_periods, period_hours=period_hours, method=method,
+                            commitment_window=horizon, voll=voll)
+    agg_status = agg.optimize(solver_name=solver_name, **kwargs)
+    agg_time = time.perf_counter() - t0
+    if full_status[0] != "ok" or agg_status[0] != "ok":
+        return {"full_status": full_status, "aggregated_status": agg_status}
+
+    report = {
+        "full_time_s": full_time,
+        "aggregated_time_s": agg_time,
+        "speedup": full_time/agg_time,
+        "full_cost": cost(full),
+        "aggregated_cost": cost(agg.network),
+        "full_co2": co2(full),
+        "aggregated_co2": co2(agg.network),
+        "max_profile_error": float(agg.profile_error.max()),
+    }
+    report["cost_error"] = abs(report["aggregated_cost"] - report["full_cost"])/abs(report["full_cost"])
+    report["co2_error"] = abs(report["aggregated_co2"] - report["full_co2"])/abs(report["full_co2"])
+    return report
+
+
+def main():
+    from sweep import DEFAULTS
+
+    parser = argparse.ArgumentParser(description="Écart entre le calcul agrégé et l'horizon glissant")
+    parser.add_argument("--horizon", type=int, default=8760, help="durée simulée (h)")
+    parser.add_argument("--date-debut", type=int, default=0)
+    parser.add_argument("--capa-year", type=int, default=DEFAULTS["capa_data_year"])
+    parser.add_argument("--periods", type=int, nargs="+", default=[12], help="nombre de périodes représentatives")
+    parser.add_argument("--period-hours", type=int, default=24)
+    parser.add_argument("--method", choices=["kmedoids", "kmeans", "hierarchical"], default="kmedoids")
+    parser.add_argument("--solver", default="highs")
+    args = parser.parse_args()
+
+    params = dict(DEFAULTS, time_horizon_in_hours=args.horizon, date_debut=args.date_debut,
+                  capa_data_year=args.capa_year)
+    reference = rolling_reference(params, args.solver)
+    rows = [dict(n_periods=n, **compare_aggregation(params, n, args.period_hours, args.method, args.solver,
+                                                    reference=reference))
+            for n in args.periods]
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,33 @@ Created on Mon Nov  3 10:45:50 2025
 
 import streamlit as st
 import pandas as pd
+import plotly.express as px
+import pyarrow.dataset as ds
 import matplotlib.pyplot as plt
 import datetime
+import os
 from datetime import timedelta
-from main import *
+from main import prep_network, return_scenario
+from plots import plot_co2overtime_plotly, plot_comparatifco2energy, plot_evolstorage_plotly, plot_results_plotly
+from network_template import NetworkTemplate
+from extraction import DEFAULT_OUTPUTS
+from rolling_horizon import simulate_rolling_horizon
+from result_cache import CACHE as RESULT_CACHE, result_key
+from result_store import STORE as RUN_STORE
+from solve import SOLVE_MODES, SolverConfig, available_solvers, is_incumbent
+from fast_dispatch import DISPATCH_MODE, optimize_dispatch
+from jobs import JobManager, DONE, FAILED, RUNNING
+from instrumentation import REGISTRY, recording, span
+from kpi import compute_results
+from downsampling import MAX_POINTS, lttb, use_webgl
+from export import FORMATS as EXPORT_FORMATS, MIME_TYPES as EXPORT_MIME_TYPES, spool, stream_network
 st.set_page_config(page_title="Simulation mix électrique", layout="wide")
 
-# Initialisation de l'historique
-if 'historique_simulations' not in st.session_state:
-    st.session_state.historique_simulations = []
+# L'historique liste les runs de cette session (identifiants gardés ici), lus
+# dans le stockage Parquet partagé par tout le serveur (cf. result_store.py) ;
+# "effacer" vide cette liste, les runs restant enregistrés (ajout seul)
+if 'historique' not in st.session_state:
+    st.session_state.historique = []
     
 st.title("⚡ Simulation de réseau électrique - France")
 
@@ -54,13 +72,22 @@ mois = {
 }
 
 # --- Widgets utilisateur ---
-time_horizon_in_hours = st.sidebar.slider("Durée de la simulation (jours)", 1, 31, 7, step=1)*24
+# Au-delà d'un mois, le MILP est résolu par fenêtres de 7 jours (+1 jour d'anticipation)
+horizon_glissant = st.sidebar.checkbox("Horizon glissant (simulations longues)", value=False)
+time_horizon_in_hours = st.sidebar.slider("Durée de la simulation (jours)", 1, 365 if horizon_glissant else 31, 7, step=1)*24
 widget_debut = st.sidebar.selectbox("Mois de départ",mois.keys())
 date_debut = mois.get(widget_debut)
 
 demand_multiplier = st.sidebar.slider("Facteur multiplicatif de la demande", 0.5, 2.0, 1.0, 0.1)
 capa_data_year = st.sidebar.selectbox("Année de données de capacité", [2025, 2028, 2030, 2033])
 charge_initiale_stockage = st.sidebar.slider("Taux initial de charge du stockage", 0.0, 1.0, 0.8, 0.1)
+# Le mode rapide relâche l'engagement des centrales (LP) : réponse quasi immédiate,
+# le MILP exact reste à privilégier pour les résultats définitifs
+modes_resolution = {"Exact (MILP)": "exact", "Rapide (relaxation linéaire)": "fast"}
+# dispatch sans engagement, LP dédié résolu par HiGHS (cf. fast_dispatch.py) : une année en quelques secondes
+if "highs" in available_solvers():
+    modes_resolution["Dispatch sans engagement (LP dédié)"] = DISPATCH_MODE
+mode = modes_resolution[st.sidebar.radio("Mode de résolution", list(modes_resolution))]
 
 st.sidebar.markdown("---")
 st.sidebar.subheader("Paramètres stockage")
@@ -68,6 +95,19 @@ p_bat = st.sidebar.slider("Puissance batteries (MW)", 1, 2000, 470, 100)
 capa_bat = st.sidebar.slider("Capacité batteries (MWh)", 1, 20000, 940, 200)
 p_hyd = st.sidebar.slider("Puissance hydro (MW)", 1, 4000, 3800, 500)
 capa_hyd = st.sidebar.slider("Capacité hydro (MWh)", 1, 200000, 100000, 5000)
+st.sidebar.markdown("---")
+st.sidebar.subheader("Solveur")
+# seuls les solveurs effectivement installés sont proposés
+solveurs = available_solvers()
+solveur = st.sidebar.selectbox("Solveur", solveurs, index=solveurs.index("cbc") if "cbc" in solveurs else 0)
+threads = st.sidebar.number_input("Threads", 1, 64, 1)
+# une limite de temps rend la meilleure solution trouvée, sans preuve d'optimalité
+limite_temps = st.sidebar.number_input("Limite de temps (s, 0 = aucune)", 0, 3600, 0, 10)
+ecart_mip = st.sidebar.number_input("Écart MIP accepté (%)", 0.0, 10.0, 0.0, 0.1)
+config_solveur = SolverConfig(solveur, threads=int(threads), time_limit=limite_temps or None,
+                              mip_rel_gap=ecart_mip/100 or None)
+st.sidebar.markdown("---")
+afficher_diagnostics = st.sidebar.checkbox("Afficher les diagnostics", value=False)
 
 
 
@@ -82,7 +122,7 @@ st.subheader("Aperçu temporel")
 
 year_hours = 8760
 progress_start = date_debut / year_hours
-progress_end = (date_debut + time_horizon_in_hours) / year_hours
+progress_end = min((date_debut + time_horizon_in_hours) / year_hours, 1.0)
 
 st.progress(progress_start, text="Début de la période")
 st.progress(progress_end, text="Fin de la période")
@@ -93,96 +133,300 @@ st.caption(f"Période : {start_date.strftime('%d %b %Y %H:%M')} → {end_date.st
 
 
 
+# --- Résolution en arrière-plan ---
+# Un seul pool pour toutes les sessions : le nombre de résolutions simultanées
+# est borné et l'interface reste réactive pendant le calcul
+@st.cache_resource
+def job_manager():
+    return JobManager()
+
+
+def resoudre(job, params, mode, horizon_glissant, template, config):
+    # exécuté dans un thread du pool : aucun appel st.* ici
+    with recording(job.description) as run:
+        network, result, template = _resoudre(job, params, mode, horizon_glissant, template, config)
+    return network, result, template, run
+
+
+def _resoudre(job, params, mode, horizon_glissant, template, config):
+    if mode == DISPATCH_MODE:
+        # toute la période en un seul LP : ni horizon glissant ni modèle réutilisé
+        job.set_progress(0.1, "Préparation du réseau")
+        network = prep_network(**params)
+        job.set_progress(0.3, "Optimisation en cours")
+        result = optimize_dispatch(network, config.options() if config.name == "highs" else None)
+    elif horizon_glissant:
+        job.set_progress(0.0, "Préparation du réseau")
+        network, result = simulate_rolling_horizon(**params, horizon=168, overlap=24,
+                                                   **config.solve_kwargs(),
+                                                   callback=lambda i, n: job.set_progress(i/n, f"Fenêtre {i}/{n}"),
+                                                   **SOLVE_MODES[mode])
+    else:
+        # Le réseau n'est reconstruit que si les données changent ; changer de mois
+        # re-découpe les séries déjà chargées, le stockage et la demande ne
+        # modifient que le modèle
+        job.set_progress(0.1, "Préparation du réseau")
+        if template is not None and template.mode == mode and template.matches(**params):
+            template.update(**params)
+        else:
+            template = NetworkTemplate(**params, mode=mode)
+        # dernier point d'annulation : la résolution elle-même n'est pas interruptible
+        job.check_cancelled()
+        job.set_progress(0.3, "Optimisation en cours")
+        # un modèle réutilisé repart de la solution précédente ; seuls la production,
+        # le stockage et le prix marginal sont relus
+        result = template.optimize(**config.solve_kwargs(), outputs=DEFAULT_OUTPUTS, warm_start=True)
+        job.check_cancelled()
+        # le gabarit reste à la session et sera modifié par la prochaine simulation :
+        # les résultats affichés et exportés portent sur une copie
+        network = template.result_network()
+    return network, result, template
+
+
+def vider_exports():
+    # fichiers temporaires des téléchargements du résultat précédent
+    for chemin in st.session_state.get('exports', {}).values():
+        if os.path.exists(chemin):
+            os.remove(chemin)
+    st.session_state.exports = {}
+
+
+def enregistrer_resultat(network, result, params, meta, run=None):
+    st.session_state.resultat = (network, result)
+    st.session_state.diagnostics = run
+    st.session_state.figures = None
+    st.session_state.indicateurs = None
+    vider_exports()
+    if result[0] == 'ok':
+        # post-traitement fait une fois : tracés et historique lisent les mêmes résultats
+        with recording(run=run), span("kpi"):
+            st.session_state.indicateurs = compute_results(network)
+        # --- ENREGISTREMENT DANS L'HISTORIQUE ---
+        # paramètres, indicateurs et séries temporelles complètes du run
+        run_id = RUN_STORE.append(params, network, kpis=st.session_state.indicateurs.kpis(), source="app",
+                                  status=result[0], condition=result[1], **meta)
+        st.session_state.historique.append(run_id)
+
+
+@st.fragment(run_every=1)
+def suivi_simulation():
+    job = job_manager().get(st.session_state.get('job_id'))
+    if job is None:
+        # tâche inconnue du serveur (purgée, ou serveur redémarré) : le lancement est débloqué
+        del st.session_state['job_id']
+        st.session_state.avertissement = "La simulation en cours n'est plus suivie par le serveur : relancez-la."
+        st.rerun()
+    if not job.done:
+        st.progress(job.progress, text=f"{job.status} - {job.message} ({job.elapsed():.0f} s)")
+        # seul l'horizon glissant s'arrête entre deux fenêtres ; une résolution d'un seul
+        # tenant va à son terme avant que l'annulation soit prise en compte
+        meta = job.meta["run_meta"]
+        interruptible = meta["horizon_glissant"] and meta["mode"] != DISPATCH_MODE
+        if st.button("Annuler la simulation" if interruptible
+                     else "Annuler (pris en compte à la fin de la résolution en cours)"):
+            job_manager().cancel(job.id)
+        return
+
+    del st.session_state['job_id']
+    if job.status == DONE:
+        network, result, template, run = job.result
+        if template is not None:
+            st.session_state.network_template = template
+        if result[0] == 'ok':
+            RESULT_CACHE.put(job.meta["cle"], network, *result)
+        enregistrer_resultat(network, result, job.meta["params"], job.meta["run_meta"], run)
+    elif job.status == FAILED:
+        st.session_state.resultat = None
+        st.session_state.erreur = str(job.error)
+    else:
+        st.session_state.resultat = None
+    # nouvelle exécution complète du script pour afficher les graphiques
+    st.rerun()
+
+
 # --- Lancement de la simulation ---
-if st.button("🚀 Lancer la simulation"):
-    with st.spinner("Préparation du réseau et lancement du solveur..."):
-        network = prep_network(
-            time_horizon_in_hours=int(time_horizon_in_hours),
-            date_debut=int(date_debut),
-            demand_multiplier=demand_multiplier,
-            climatic_data_year=2025,
-            clim_year=2012,
-            capa_data_year=capa_data_year,
-            p_bat=p_bat,
-            capa_bat=capa_bat,
-            p_hyd=p_hyd,
-            capa_hyd=capa_hyd,
-            charge_initiale_stockage=charge_initiale_stockage
-        )
-
-        st.success("Réseau prêt. Optimisation en cours...")
-        result = network.optimize(solver_name="cbc", assign_all_duals=True)
+simulation_en_cours = 'job_id' in st.session_state
+if st.button("🚀 Lancer la simulation", disabled=simulation_en_cours):
+    params = dict(
+        time_horizon_in_hours=int(time_horizon_in_hours),
+        date_debut=int(date_debut),
+        demand_multiplier=demand_multiplier,
+        climatic_data_year=2025,
+        clim_year=2012,
+        capa_data_year=capa_data_year,
+        p_bat=p_bat,
+        capa_bat=capa_bat,
+        p_hyd=p_hyd,
+        capa_hyd=capa_hyd,
+        charge_initiale_stockage=charge_initiale_stockage
+    )
+    st.session_state.pop('erreur', None)
+    # Une combinaison déjà résolue est rechargée depuis le cache disque
+    glissant = dict(horizon=168, overlap=24) if horizon_glissant else {}
+    cle = result_key(params, solver_name=config_solveur.name, solver_options=config_solveur.options(),
+                     outputs=list(DEFAULT_OUTPUTS), mode=mode, **glissant)
+    meta = dict(solver=config_solveur.name, mode=mode, horizon_glissant=horizon_glissant, cache_key=cle)
+    cached = RESULT_CACHE.get(cle)
+    if cached is not None:
+        enregistrer_resultat(cached["network"], (cached["status"], cached["condition"]), params, meta)
+        st.success("Simulation déjà calculée, résultats rechargés depuis le cache.")
+    else:
+        # le modèle réutilisable est confié à la tâche, qui le rend à la fin
+        template = None if horizon_glissant else st.session_state.pop('network_template', None)
+        job_id = job_manager().submit(resoudre, params, mode, horizon_glissant, template, config_solveur,
+                                      description=f"{widget_debut}, {time_horizon_in_hours//24} j",
+                                      meta=dict(cle=cle, params=params, run_meta=meta))
+        st.session_state.job_id = job_id
+        st.session_state.resultat = None
+        simulation_en_cours = True
+
+if simulation_en_cours:
+    st.caption(f"Résolutions en cours sur le serveur : {job_manager().stats()[RUNNING]} "
+               f"(maximum {job_manager().max_concurrent} simultanées)")
+    suivi_simulation()
+
+if 'avertissement' in st.session_state:
+    st.warning(st.session_state.pop('avertissement'))
+
+resultat = st.session_state.get('resultat')
+if resultat is not None:
+    network, result = resultat
+    if is_incumbent(*result):
+        st.warning(f"Optimalité non prouvée ({result[1]}) : meilleure solution trouvée affichée.")
+    else:
         st.success("Optimisation terminée !")
-        
-        # --- Affichage des résultats ---
-        if result[0] == 'ok':
-            
-            
-            st.plotly_chart(plot_results_plotly(network))
-    
-            # st.subheader("Bilan énergétique global")
-            # plot_energybalance(network)
-            # st.pyplot(plt.gcf())
-    
-            
-            st.plotly_chart(plot_evolstorage_plotly(network), width='stretch')
-            
-            st.plotly_chart(plot_comparatifco2energy(network),width='stretch')
-            
-            fig, total_co2 = plot_co2overtime_plotly(network)
-            st.plotly_chart(fig, width='stretch')
-            st.metric(label="Émissions totales de CO₂", value=f"{total_co2:,.0f} tonnes eq.")
-        # --- ENREGISTREMENT DANS L'HISTORIQUE ---
-            # On crée un dictionnaire avec les paramètres d'entrée et les résultats clés
-            simulation_record = {
-                "ID": len(st.session_state.historique_simulations) + 1,
-                "Mois": widget_debut,
-                "Durée (j)": time_horizon_in_hours/24,
-                "Année Scénario": capa_data_year,
-                "Demande (x)": demand_multiplier,
-                "P Batt (MW)": p_bat,
-                "Capa Batt (MWh)": capa_bat,
-                "P Hydro (MW)": p_hyd,
-                "CO₂ Total (t)": round(total_co2, 2)
-            }
-            st.session_state.historique_simulations.append(simulation_record)
-            
-            # --- SECTION TELECHARGEMENT (PERSISTANCE LOCALE) ---
-            st.subheader("📥 Téléchargement des données")
-            
-            # Exemple : Téléchargement des séries temporelles des générateurs
-            # On suppose que network.generators_t.p contient la production
-            try:
-                df_export = network.generators_t.p.copy()
-                csv = df_export.to_csv(index=True).encode('utf-8')
-                
+    run = st.session_state.get('diagnostics')
+    if run is not None and "warm_start_saved_s_estimate" in run.stats:
+        st.caption(f"Démarrage à chaud depuis la simulation précédente : gain estimé de "
+                   f"{run.stats['warm_start_saved_s_estimate']:+.1f} s par rapport à la dernière résolution à froid "
+                   f"(autres paramètres).")
+
+    # --- Affichage des résultats ---
+    if result[0] == 'ok':
+
+        # figures construites une fois par résultat, pas à chaque interaction ;
+        # l'extraction est mesurée dans le Run de la résolution
+        if st.session_state.get('figures') is None:
+            with recording(run=st.session_state.get('diagnostics')), span("extraction"):
+                indicateurs = st.session_state.get('indicateurs') or compute_results(network)
+                st.session_state.figures = (plot_results_plotly(network, indicateurs),
+                                            plot_evolstorage_plotly(network, indicateurs),
+                                            plot_comparatifco2energy(network, indicateurs),
+                                            plot_co2overtime_plotly(network, indicateurs))
+        *figures, (fig, total_co2) = st.session_state.figures
+
+        st.plotly_chart(figures[0])
+
+        # st.subheader("Bilan énergétique global")
+        # plot_energybalance(network)
+        # st.pyplot(plt.gcf())
+
+
+        st.plotly_chart(figures[1], width='stretch')
+
+        st.plotly_chart(figures[2],width='stretch')
+
+        st.plotly_chart(fig, width='stretch')
+        st.metric(label="Émissions totales de CO₂", value=f"{total_co2:,.0f} tonnes eq.")
+
+        # --- SECTION TELECHARGEMENT (PERSISTANCE LOCALE) ---
+        st.subheader("📥 Téléchargement des données")
+
+        # Production, stockage, état de charge, prix et indicateurs, écrits par
+        # tranches dans un format compressé (cf. export.py) vers un fichier
+        # temporaire sur disque, préparé une fois par résultat et par format ;
+        # la session ne garde que son chemin
+        format_export = st.selectbox("Format", list(EXPORT_FORMATS),
+                                     format_func={"parquet": "Parquet", "arrow": "Arrow IPC",
+                                                  "csv": "CSV (archive zip)"}.get)
+        try:
+            exports = st.session_state.setdefault('exports', {})
+            if format_export not in exports:
+                indicateurs = st.session_state.get('indicateurs')
+                kpis = indicateurs.kpis() if indicateurs is not None else None
+                exports[format_export] = spool(stream_network(network, format_export, kpis), format_export)
+
+            with open(exports[format_export], "rb") as fichier:
                 st.download_button(
-                    label="Télécharger les résultats (CSV)",
-                    data=csv,
-                    file_name=f'resultats_simulation_{datetime.datetime.now().strftime("%Y%m%d_%H%M")}.csv',
-                    mime='text/csv',
+                    label="Télécharger les résultats",
+                    data=fichier,
+                    file_name=f'resultats_simulation_{datetime.datetime.now().strftime("%Y%m%d_%H%M")}'
+                              f'{EXPORT_FORMATS[format_export]}',
+                    mime=EXPORT_MIME_TYPES[format_export],
                 )
-            except Exception as e:
-                st.warning(f"Préparation du téléchargement impossible : {e}")
-
-        else:
-            st.error("Le solveur n'a pas trouvé de solution satisfaisante. Vous pouvez réduire la charge sur le réseau ou ajouter du stockage.", icon="🚨")
-
-else:
+        except Exception as e:
+            st.warning(f"Préparation du téléchargement impossible : {e}")
+
+    else:
+        st.error("Le solveur n'a pas trouvé de solution satisfaisante. Vous pouvez réduire la charge sur le réseau ou ajouter du stockage.", icon="🚨")
+
+    if afficher_diagnostics:
+        with st.expander("🩺 Diagnostics", expanded=True):
+            run = st.session_state.get('diagnostics')
+            if run is None:
+                st.write("Résultats rechargés depuis le cache : pas de mesure pour cette simulation.")
+            else:
+                diagnostics = run.to_dict()
+                col1, col2 = st.columns(2)
+                col1.write("Durée des phases (s)")
+                col1.dataframe(run.durations().round(3).rename("durée (s)"))
+                col2.write("Modèle et solveur")
+                col2.json({**diagnostics["stats"], "peak_rss_mb": diagnostics["peak_rss_mb"],
+                           "peak_rss_solveurs_mb": diagnostics["peak_rss_children_mb"]})
+            st.write("Cumul sur le serveur")
+            st.json(REGISTRY.snapshot())
+
+elif 'erreur' in st.session_state:
+    st.error(f"La simulation a échoué : {st.session_state.erreur}", icon="🚨")
+elif not simulation_en_cours:
     st.info("Choisis les paramètres et lance la simulation.")
 
-if st.session_state.historique_simulations:
+historique = (RUN_STORE.runs(ds.field("run_id").isin(st.session_state.historique))
+              if st.session_state.historique else pd.DataFrame())
+if not historique.empty:
     st.divider()
     st.header("📚 Historique et comparaison des scénarios")
-    st.write("Ce tableau enregistre vos essais tant que la page reste ouverte.")
-    
-    # Conversion en DataFrame pour affichage
-    df_hist = pd.DataFrame(st.session_state.historique_simulations)
+    st.write("Ce tableau liste les simulations lancées dans cette session ; "
+             "elles restent enregistrées sur le serveur après effacement.")
+
+    # Conversion des paramètres stockés en colonnes d'affichage
+    noms_mois = {heure: nom for nom, heure in mois.items()}
+    df_hist = pd.DataFrame({
+        "ID": range(1, len(historique) + 1),
+        "Mois": historique["date_debut"].astype(int).map(noms_mois),
+        "Durée (j)": historique["time_horizon_in_hours"]/24,
+        "Année Scénario": historique["capa_data_year"],
+        "Demande (x)": historique["demand_multiplier"],
+        "P Batt (MW)": historique["p_bat"],
+        "Capa Batt (MWh)": historique["capa_bat"],
+        "P Hydro (MW)": historique["p_hyd"],
+        "CO₂ Total (t)": historique["co2_total"].round(2),
+        # indicateurs absents des runs enregistrés avant leur ajout : cases vides
+        "Intensité CO₂ (g/kWh)": historique.reindex(columns=["co2_intensity"]).iloc[:, 0].round(1),
+        "Prix moyen (€/MWh)": historique.reindex(columns=["price_mean"]).iloc[:, 0].round(1),
+    })
     st.dataframe(df_hist,width='stretch', hide_index=True)
-    
-    # Bouton pour effacer l'historique
-    if st.button("Effacer l'historique"):
-        st.session_state.historique_simulations = []
+
+    # Comparaison des séries temporelles, lues seulement pour les runs choisis
+    ids_runs = dict(zip(df_hist["ID"], historique["run_id"]))
+    choix = st.multiselect("Simulations à comparer", list(ids_runs), default=list(ids_runs)[-2:])
+    series = {"État de charge hydro": ("state_of_charge", "Hydro - pompage"),
+              "État de charge batteries": ("state_of_charge", "Batteries"),
+              "Prix marginal": ("marginal_price", "FR")}
+    serie = st.selectbox("Série comparée", list(series))
+    if choix:
+        nom_serie, composant = series[serie]
+        ts = RUN_STORE.timeseries([ids_runs[i] for i in choix], nom_serie, names=[composant])
+        ts["ID"] = ts["run_id"].map({run_id: i for i, run_id in ids_runs.items()}).astype(str)
+        # une courbe réduite par run, en WebGL sur les horizons longs
+        ts = ts.sort_values("snapshot").groupby("ID", group_keys=False)[["snapshot", "value", "ID"]].apply(
+            lambda run: run.iloc[lttb(run["value"].values, MAX_POINTS)])
+        st.plotly_chart(px.line(ts, x="snapshot", y="value", color="ID", title=serie,
+                                render_mode="webgl" if use_webgl(len(ts)) else "svg"), width='stretch')
+
+    # Bouton pour effacer l'historique de la session (le stockage n'est pas modifié)
+    if st.button("Effacer l'historique de la session"):
+        st.session_state.historique = []
         st.rerun() # Rafraîchit l'app pour mettre à jour l'affichage
 
         
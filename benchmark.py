@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Mesure des performances, étape par étape.
+
+Pour chaque cas (horizon x année de capacité) on chronomètre séparément :
+- data_load : lecture des données à froid (capacités ERAA et séries du stock
+  binaire, cache mémoire vidé),
+- build : construction des composants dans prep_network (données en cache),
+- model : construction du modèle linopy,
+- solve_<solveur> : résolution par chaque solveur disponible sur le même
+  modèle,
+- plot_<fonction> : chaque fonction de tracé sur le réseau résolu.
+
+Le temps d'import à froid des modules (interpréteur neuf, sans cache) est
+mesuré à part et comparé à IMPORT_BUDGETS : les workers des pools et les
+commandes en ligne ne doivent pas payer pypsa, linopy, matplotlib ou
+streamlit avant d'en avoir besoin.
+
+Les résultats sont écrits en JSON avec la mémoire de pointe (RSS du
+processus et des solveurs, pic Python par cas avec --trace-memory). Avec
+--compare, le run est comparé à une référence enregistrée et les étapes plus
+lentes que la tolérance sont signalées (code de sortie 1).
+
+Exemple :
+    python benchmark.py --horizons 24 168 744 --capa-years 2025 2033 --output bench.json
+    python benchmark.py --compare bench.json
+    python benchmark.py --imports-only
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import linopy
+import matplotlib.pyplot as plt
+import pandas as pd
+import pypsa
+import main
+import plots
+from data_cache import CACHE, get_capacities, get_dates, get_series
+from instrumentation import model_stats, peak_rss_mb
+from sweep import DEFAULTS
+from timeseries_store import SOURCES, ensure_ingested
+
+SOLVERS = ["cbc", "highs", "glpk"]
+PLOTS = ["plot_results_plotly", "plot_co2overtime_plotly", "plot_comparatifco2energy", "plot_evolstorage_plotly"]
+DEFAULT_HORIZONS = [24, 168, 744]
+# mai : le cas de base reste faisable sur les horizons longs
+DEFAULT_DATE_DEBUT = 2880
+
+# en dessous, un écart de temps n'est pas significatif
+MIN_REGRESSION_S = 0.05
+
+# temps d'import à froid maximal (s) ; pypsa seul prend plus de 2 s
+IMPORT_BUDGETS = {"main": 0.6, "kpi": 0.6, "solve": 0.7, "sweep": 0.8, "monte_carlo": 0.9,
+                  "rolling_horizon": 0.7, "result_store": 0.8, "fast_dispatch": 0.8, "jobs": 0.1}
+
+
+def _timed(stages, name, fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    # les print de prep_network et des solveurs faussent les temps sur un terminal lent
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    stages[name] = time.perf_counter() - t0
+    return result
+
+
+def load_data(params):
+    CACHE.clear()
+    get_capacities(params["capa_data_year"])
+    get_dates(params["climatic_data_year"], params["clim_year"])
+    for series in SOURCES:
+        get_series(series, params["climatic_data_year"], params["clim_year"])
+
+
+def run_case(params, solvers, trace_memory=False):
+    stages = {}
+    # tracemalloc ralentit nettement la construction du modèle : mesure à part
+    if trace_memory:
+        tracemalloc.start()
+    _timed(stages, "data_load", load_data, params)
+    network = _timed(stages, "build", main.prep_network, **params)
+    model = _timed(stages, "model", network.optimize.create_model)
+
+    case = dict(horizon_h=params["time_horizon_in_hours"], capa_year=params["capa_data_year"],
+                snapshots=len(network.snapshots), generators=len(network.generators),
+                **model_stats(model), solvers={})
+    solved = False
+    for solver in solvers:
+        name = "solve_" + solver
+        status, condition = _timed(stages, name, network.optimize.solve_model, solver_name=solver)
+        case["solvers"][solver] = dict(status=status, condition=condition,
+                                       objective=network.objective if status == "ok" else None)
+        solved = solved or status == "ok"
+
+    if solved:
+        for plot in PLOTS:
+            _timed(stages, plot, getattr(plots, plot), network)
+        plt.close("all")
+
+    if trace_memory:
+        case["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1]/1024**2, 1)
+        tracemalloc.stop()
+    rss, rss_children = peak_rss_mb()
+    case.update(stages={k: round(v, 4) for k, v in stages.items()},
+                peak_rss_mb=round(rss, 1), peak_rss_children_mb=round(rss_children, 1))
+    return case
+
+
+def run_benchmark(horizons=DEFAULT_HORIZONS, capa_years=(DEFAULTS["capa_data_year"],), solvers=None,
+                  date_debut=DEFAULT_DATE_DEBUT, repeat=1, trace_memory=False):
+    available = [s for s in (solvers or SOLVERS) if s in linopy.available_solvers]
+    skipped = [s for s in (solvers or SOLVERS) if s not in available]
+    if not available:
+        raise RuntimeError("Aucun solveur disponible parmi " + ", ".join(solvers or SOLVERS))
+    base = dict(DEFAULTS, date_debut=date_debut)
+    ensure_ingested(base["climatic_data_year"])
+
+    cases = []
+    for capa_year in capa_years:
+        for horizon in horizons:
+            params = dict(base, time_horizon_in_hours=horizon, capa_data_year=capa_year)
+            # on garde, étape par étape, le meilleur temps des répétitions
+            runs = [run_case(params, available, trace_memory) for _ in range(repeat)]
+            case = runs[0]
+            case["stages"] = {k: min(run["stages"][k] for run in runs) for k in case["stages"]}
+            cases.append(case)
+            print(f"{capa_year} / {horizon} h : " + ", ".join(f"{k}={v:.3f}s" for k, v in case["stages"].items()))
+
+    meta = dict(created=time.strftime("%Y-%m-%dT%H:%M:%S"), python=platform.python_version(),
+                platform=platform.platform(), pypsa=pypsa.__version__, linopy=linopy.__version__,
+                date_debut=date_debut, repeat=repeat, solvers=available, skipped_solvers=skipped)
+    return {"meta": meta, "cases": cases}
+
+
+def measure_imports(modules=IMPORT_BUDGETS, repeat=3):
+    # chaque import dans un interpréteur neuf ; meilleur temps des répétitions
+    code = "import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)"
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    timings = {}
+    for module in modules:
+        runs = [subprocess.run([sys.executable, "-c", code.format(module)], cwd=cwd, capture_output=True,
+                               text=True, check=True).stdout.split()[-1] for _ in range(repeat)]
+        timings[module] = round(min(float(t) for t in runs), 4)
+    return timings
+
+
+def check_imports(timings, budgets=IMPORT_BUDGETS):
+    rows = [dict(module=module, seconds=seconds, budget_s=budgets.get(module),
+                 over_budget=module in budgets and seconds > budgets[module])
+            for module, seconds in timings.items()]
+    return pd.DataFrame(rows)
+
+
+def _by_case(report):
+    return {(case["horizon_h"], case["capa_year"]): case for case in report["cases"]}
+
+
+def compare(current, baseline, tolerance=0.2, min_seconds=MIN_REGRESSION_S):
+    rows = []
+    reference = _by_case(baseline)
+    for key, case in _by_case(current).items():
+        if key not in reference:
+            continue
+        for stage, seconds in case["stages"].items():
+            before = reference[key]["stages"].get(stage)
+            if before is None:
+                continue
+            regression = seconds > before*(1 + tolerance) and seconds - before > min_seconds
+            rows.append(dict(horizon_h=key[0], capa_year=key[1], stage=stage, baseline_s=before,
+                             current_s=seconds, ratio=seconds/before if before else float("inf"),
+                             regression=regression))
+        # mémoire : seulement si les deux runs l'ont tracée
+        before_mem, mem = reference[key].get("peak_traced_mb"), case.get("peak_traced_mb")
+        if before_mem and mem:
+            rows.append(dict(horizon_h=key[0], capa_year=key[1], stage="peak_traced_mb", baseline_s=before_mem,
+                             current_s=mem, ratio=mem/before_mem, regression=mem > before_mem*(1 + tolerance)))
+    for module, seconds in current.get("imports", {}).items():
+        before = baseline.get("imports", {}).get(module)
+        if before:
+            rows.append(dict(horizon_h=None, capa_year=None, stage="import_" + module, baseline_s=before,
+                             current_s=seconds, ratio=seconds/before,
+                             regression=seconds > before*(1 + tolerance) and seconds - before > min_seconds))
+    return pd.DataFrame(rows)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark construction / résolution / tracés")
+    parser.add_argument("--horizons", type=int, nargs="+", default=DEFAULT_HORIZONS)
+    parser.add_argument("--capa-years", type=int, nargs="+", default=[DEFAULTS["capa_data_year"]])
+    parser.add_argument("--solvers", nargs="+", default=SOLVERS)
+    parser.add_argument("--date-debut", type=int, default=DEFAULT_DATE_DEBUT)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true", help="pointe mémoire Python par cas (plus lent)")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", default=None, help="fichier JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="ralentissement toléré (0.2 = +20 %%)")
+    parser.add_argument("--imports-only", action="store_true", help="seulement les temps d'import")
+    args = parser.parse_args()
+
+    imports = check_imports(measure_imports())
+    print(imports.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    over_budget = imports[imports["over_budget"]]
+    if not over_budget.empty:
+        print(f"{len(over_budget)} module(s) au-delà du budget d'import : " + ", ".join(over_budget["module"]))
+    if args.imports_only:
+        return 1 if not over_budget.empty else 0
+
+    report = run_benchmark(args.horizons, args.capa_years, args.solvers, args.date_debut, args.repeat,
+                           args.trace_memory)
+    report["imports"] = dict(zip(imports["module"], imports["seconds"]))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print("Résultats écrits dans " + args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        table = compare(report, baseline, args.tolerance)
+        if table.empty:
+            print("Aucun cas commun avec la référence")
+            return 1 if not over_budget.empty else 0
+        print(table.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        regressions = table[table["regression"]]
+        if not regressions.empty:
+            print(f"{len(regressions)} régression(s) au-delà de {args.tolerance:.0%}")
+            return 1
+    return 1 if not over_budget.empty else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Registre des filières de production.
+
+Les paramètres statiques des filières (émissions, engagement, coûts,
+rampes...) sont lus une seule fois dans data/carriers.csv et rangés dans un
+tableau structuré NumPy, une ligne par filière :
+- min_down_share : temps minimal d'arrêt en part de la fenêtre d'engagement
+  (vide : min_down_time fixe),
+- profile : série du stock binaire donnant la disponibilité horaire
+  (facteur de charge), vide pour une disponibilité constante p_max_pu.
+
+Les profils des filières variables sont des lignes de la matrice des
+facteurs de charge écrite à l'ingestion (timeseries_store.PROFILE_SERIES) et
+mappée en mémoire (data_cache.get_profiles) ; une fenêtre simulée n'en est
+qu'une vue (tranche de colonnes).
+
+Le coût marginal est celui des anciennes FuelSources : coût primaire
+(cost_per_ton / energy_density_per_ton) multiplié par le rendement.
+"""
+import numpy as np
+import pandas as pd
+
+CARRIERS_FILE = "./data/carriers.csv"
+
+# colonnes du fichier et leur type dans le tableau
+FIELDS = [("name", "U64"), ("co2_emissions", "f8"), ("committable", "?"), ("min_up_time", "i8"),
+          ("min_down_time", "i8"), ("min_down_share", "f8"), ("energy_density_per_ton", "f8"),
+          ("cost_per_ton", "f8"), ("efficiency", "f8"), ("p_min_pu", "f8"), ("p_max_pu", "f8"),
+          ("ramp_limit_up", "f8"), ("ramp_limit_down", "f8"), ("profile", "U32")]
+# colonnes calculées au chargement
+DERIVED = [("primary_cost", "f8"), ("marginal_cost", "f8")]
+DTYPE = np.dtype(FIELDS + DERIVED)
+
+
+def read_carriers(path=CARRIERS_FILE):
+    frame = pd.read_csv(path, sep=";", dtype={"name": str, "profile": str, "committable": bool},
+                        keep_default_na=False, na_values={name: [""] for name, kind in FIELDS if kind == "f8"})
+    table = np.zeros(len(frame), dtype=DTYPE)
+    for name, _ in FIELDS:
+        table[name] = frame[name].to_numpy()
+    density = table["energy_density_per_ton"]
+    table["primary_cost"] = np.divide(table["cost_per_ton"], density, out=np.zeros(len(table)),
+                                      where=density != 0)
+    table["marginal_cost"] = table["primary_cost"]*table["efficiency"]
+    return table
+
+
+class CarrierRegistry:
+    # table des filières et index nom -> ligne ; partagée, ne pas modifier
+
+    __slots__ = ("table", "rows")
+
+    def __init__(self, table):
+        self.table = table
+        self.rows = {name: i for i, name in enumerate(table["name"])}
+
+    @property
+    def names(self):
+        return self.table["name"]
+
+    @property
+    def variable(self):
+        # filières à disponibilité horaire, dans l'ordre de profile_series
+        return self.names[self.table["profile"] != ""]
+
+    @property
+    def profile_series(self):
+        return self.table["profile"][self.table["profile"] != ""]
+
+    def min_down_times(self, commitment_window):
+        # temps minimaux d'arrêt relatifs à la fenêtre d'engagement
+        shared = ~np.isnan(self.table["min_down_share"])
+        values = (commitment_window*self.table["min_down_share"][shared]).astype(int)
+        return dict(zip(self.names[shared], values.tolist()))
+
+    def resolve(self, commitment_window):
+        # copie de la table avec les temps minimaux d'arrêt de la fenêtre
+        table = self.table.copy()
+        shared = ~np.isnan(table["min_down_share"])
+        table["min_down_time"][shared] = (commitment_window*table["min_down_share"][shared]).astype(int)
+        return table
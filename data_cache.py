@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Cache mémoire des données d'entrée partagé par tout le processus.
+
+Les tables de capacités ERAA et les séries par année climatique sont gardées
+en mémoire après la première lecture, dans la limite d'un budget en octets
+(éviction LRU). Le cache est un simple objet Python : il sert aussi bien à
+l'application Streamlit qu'aux calculs en lot.
+
+Le budget par défaut peut être fixé par la variable d'environnement
+BESS_DATA_CACHE_MB. Les objets renvoyés sont partagés : ne pas les modifier.
+"""
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from carriers import CARRIERS_FILE, CarrierRegistry, read_carriers
+from timeseries_store import load_dates, load_profiles, load_series
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("BESS_DATA_CACHE_MB", 256)) * 1024**2)
+
+
+def _sizeof(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True, index=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    return 0
+
+
+class DataCache:
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, loader):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # chargement hors verrou : une lecture disque ne bloque pas les autres threads
+        value = loader()
+        size = _sizeof(value)
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self.nbytes += size
+                self._evict()
+            return self._entries[key][0] if key in self._entries else value
+
+    def _evict(self):
+        # on garde toujours au moins la dernière entrée, même hors budget
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+CACHE = DataCache()
+
+
+def get_capacities(capa_data_year):
+    return CACHE.get(("capacities", int(capa_data_year)),
+                     lambda: pd.read_csv("./data/ERAA_National_Estimates_capacities_"+str(capa_data_year)+"_france.csv", sep=';'))
+
+
+def get_dates(climatic_data_year, clim_year):
+    return CACHE.get(("dates", int(climatic_data_year), int(clim_year)),
+                     lambda: load_dates(climatic_data_year, clim_year))
+
+
+def get_series(series, climatic_data_year, clim_year):
+    return CACHE.get((series, int(climatic_data_year), int(clim_year)),
+                     lambda: load_series(series, climatic_data_year, clim_year))
+
+
+def get_carriers():
+    return CACHE.get(("carriers", CARRIERS_FILE), lambda: CarrierRegistry(read_carriers()))
+
+
+def get_profiles(climatic_data_year, clim_year):
+    # matrice (série de PROFILE_SERIES x pas de temps de l'année) des facteurs de charge :
+    # vue du tableau mappé, partagée entre processus par le cache disque
+    return CACHE.get(("profiles", int(climatic_data_year), int(clim_year)),
+                     lambda: load_profiles(climatic_data_year, clim_year))
+
+
+def cache_stats():
+    return CACHE.stats()
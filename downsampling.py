@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Réduction des séries horaires pour l'affichage.
+
+Au-delà de quelques milliers de points, un graphique Plotly alourdit la page
+sans rien montrer de plus : l'écran n'a pas plus de pixels. Les tracés
+ramènent donc chaque série à MAX_POINTS au plus :
+- lttb : Largest-Triangle-Three-Buckets, garde la forme d'une courbe (pics
+  compris) avec peu de points,
+- minmax_indices : min et max de chaque intervalle, pour ne perdre aucun
+  extrême,
+- bucket_means : moyenne par intervalle ; conserve l'énergie et garde les
+  mêmes abscisses pour toutes les colonnes (aires empilées),
+- period_rule : pas d'agrégation (heure, jour, semaine) des barres selon la
+  durée affichée.
+"""
+import numpy as np
+
+# ordre de grandeur de la largeur d'un graphique en pixels
+MAX_POINTS = 2000
+# au-delà, les traces passent en WebGL (Scattergl)
+WEBGL_THRESHOLD = 1000
+
+
+def lttb(y, n_out, x=None):
+    # indices des points retenus ; le premier et le dernier sont toujours gardés
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # point moyen de l'intervalle suivant
+        nxt_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:nxt_end].mean(), y[end:nxt_end].mean()
+        area = np.abs((x[a] - avg_x)*(y[start:end] - y[a]) - (x[a] - x[start:end])*(avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax_indices(y, n_buckets):
+    # indices du min et du max de chaque intervalle, dans l'ordre chronologique
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if 2*n_buckets >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    idx = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        chunk = y[start:end]
+        idx.extend((start + int(np.nanargmin(chunk)), start + int(np.nanargmax(chunk))))
+    return np.unique(idx)
+
+
+def decimate(series, max_points=MAX_POINTS):
+    # courbe seule : LTTB sur les valeurs
+    if len(series) <= max_points:
+        return series
+    return series.iloc[lttb(series.values, max_points)]
+
+
+def bucket_means(df, max_points=MAX_POINTS):
+    # moyenne par paquets de pas de temps consécutifs, horodatée au début du paquet
+    if len(df) <= max_points:
+        return df
+    step = -(-len(df) // max_points)
+    groups = np.arange(len(df)) // step
+    means = df.groupby(groups).mean()
+    means.index = df.index[::step]
+    return means
+
+
+def period_rule(n_hours):
+    # barres horaires jusqu'à un mois, journalières jusqu'à un an, hebdomadaires au-delà
+    if n_hours <= 31*24:
+        return None
+    if n_hours <= 366*24:
+        return "D"
+    return "W"
+
+
+def resample_sum(df, rule):
+    return df if rule is None else df.resample(rule).sum()
+
+
+def use_webgl(n_points):
+    return n_points > WEBGL_THRESHOLD
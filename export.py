@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Export en flux des résultats, par morceaux, en formats binaires compressés.
+
+Les séries d'un réseau résolu (production, stockage, état de charge, prix :
+cf. result_store.SERIES) ou de runs déjà enregistrés sont converties tranche
+par tranche (CHUNK_ROWS pas de temps, ou un lot Parquet du stockage) au
+format long (run_id, series, snapshot, name, value), puis écrites au fil de
+l'eau :
+- "parquet" : un fichier Parquet compressé (zstd),
+- "arrow" : un fichier Arrow IPC compressé (zstd), lisible sans copie,
+- "csv" : une archive zip, un CSV par série, pour les tableurs.
+Les indicateurs (une ligne par run) sont rangés dans les métadonnées du
+fichier (read_kpis) ou dans kpis.csv pour l'archive.
+
+stream_* renvoient un générateur d'octets : aucune étape ne garde plus d'une
+tranche en mémoire, quelle que soit la durée simulée ou le nombre de runs ;
+spool les écrit dans un fichier temporaire (téléchargement de l'application).
+
+Exemple :
+    python export.py --format parquet --output sweep.parquet --source sweep --capa-year 2030
+"""
+import argparse
+import io
+import os
+import tempfile
+import zipfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from result_store import SERIES, STORE, where
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".zip"}
+MIME_TYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.file",
+              "csv": "application/zip"}
+
+EXPORT_SCHEMA = pa.schema([("run_id", pa.string()), ("series", pa.string()), ("snapshot", pa.timestamp("ns")),
+                           ("name", pa.string()), ("value", pa.float32())])
+
+# un mois de pas horaires par tranche
+CHUNK_ROWS = 744
+
+
+class _ChunkSink(io.RawIOBase):
+    # flux d'écriture non repositionnable : le générateur reprend les octets au fur et à mesure
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def network_batches(network, series=tuple(SERIES), run_id=None, chunk_rows=CHUNK_ROWS):
+    # (série, lot Arrow) par tranche de pas de temps ; séries vides ignorées
+    for name in series:
+        frame = SERIES[name](network)
+        if frame.empty:
+            continue
+        columns = np.asarray(frame.columns, dtype=object)
+        for start in range(0, len(frame), chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows]
+            size = chunk.size
+            yield name, pa.RecordBatch.from_arrays([
+                pa.array([run_id]*size, pa.string()),
+                pa.array([name]*size, pa.string()),
+                pa.array(np.repeat(chunk.index.values, len(columns)), pa.timestamp("ns")),
+                pa.array(np.tile(columns, len(chunk)), pa.string()),
+                pa.array(chunk.to_numpy(dtype=np.float32).ravel(), pa.float32()),
+            ], schema=EXPORT_SCHEMA)
+
+
+def store_batches(run_ids, series=tuple(SERIES), store=STORE):
+    # séries de runs enregistrés, lues lot par lot dans le stockage Parquet
+    for name in series:
+        for batch in store.timeseries_batches(run_ids, name):
+            size = batch.num_rows
+            yield name, pa.RecordBatch.from_arrays([
+                batch.column("run_id"), pa.array([name]*size, pa.string()), batch.column("snapshot"),
+                batch.column("name"), batch.column("value").cast(pa.float32()),
+            ], schema=EXPORT_SCHEMA)
+
+
+def _metadata(kpis):
+    return {b"kpis": kpis.to_json(orient="records", date_format="iso").encode("utf-8")} if kpis is not None else None
+
+
+def stream(batches, fmt="parquet", kpis=None):
+    # octets du fichier exporté, produits au fil des lots
+    sink = _ChunkSink()
+    if fmt == "csv":
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            member, current = None, None
+            for name, batch in batches:
+                if name != current:
+                    if member is not None:
+                        member.close()
+                    member, current = archive.open(name + ".csv", "w", force_zip64=True), name
+                    header = True
+                member.write(batch.drop_columns(["series"]).to_pandas().to_csv(index=False, header=header)
+                             .encode("utf-8"))
+                header = False
+                yield sink.take()
+            if member is not None:
+                member.close()
+            if kpis is not None:
+                archive.writestr("kpis.csv", kpis.to_csv(index=False))
+        yield sink.take()
+        return
+
+    schema = EXPORT_SCHEMA.with_metadata(_metadata(kpis))
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    elif fmt == "arrow":
+        writer = pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    else:
+        raise ValueError("Format d'export inconnu : " + str(fmt))
+    with writer:
+        for _, batch in batches:
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
+
+
+def stream_network(network, fmt="parquet", kpis=None, series=tuple(SERIES), chunk_rows=CHUNK_ROWS):
+    # kpis : dictionnaire des indicateurs du run (cf. kpi.py)
+    kpis = pd.DataFrame([kpis]) if kpis is not None else None
+    return stream(network_batches(network, series, chunk_rows=chunk_rows), fmt, kpis)
+
+
+def stream_runs(runs, fmt="parquet", series=tuple(SERIES), store=STORE):
+    # runs : table des runs (store.runs), exportée avec les indicateurs
+    return stream(store_batches(list(runs["run_id"]), series, store), fmt, runs)
+
+
+def write(chunks, path):
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def spool(chunks, fmt="parquet"):
+    # export écrit au fil de l'eau dans un fichier temporaire sur disque, dont
+    # le chemin est renvoyé : à supprimer par l'appelant (os.remove)
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=FORMATS[fmt])
+    os.close(fd)
+    try:
+        write(chunks, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def read_kpis(path):
+    # indicateurs rangés dans les métadonnées d'un export Parquet ou Arrow
+    if path.endswith(FORMATS["parquet"]):
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(path).metadata
+    else:
+        with pa.memory_map(path) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata
+    return pd.read_json(io.BytesIO(metadata[b"kpis"]), orient="records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export des runs enregistrés (result_store)")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--source", default=None, help="app, sweep, monte_carlo, pareto...")
+    parser.add_argument("--capa-year", type=int, default=None)
+    parser.add_argument("--series", nargs="+", choices=list(SERIES), default=list(SERIES))
+    args = parser.parse_args()
+
+    equals = {k: v for k, v in (("source", args.source), ("capa_data_year", args.capa_year)) if v is not None}
+    runs = STORE.runs(where(**equals) if equals else None)
+    if runs.empty:
+        print("Aucun run enregistré ne correspond.")
+        return
+    output = args.output or "export" + FORMATS[args.format]
+    write(stream_runs(runs, args.format, args.series), output)
+    print(f"{len(runs)} runs exportés dans {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction sélective des résultats d'un modèle résolu.
+
+pypsa (solve_model) recopie dans le réseau la solution de toutes les
+variables, les duales de toutes les contraintes avec assign_all_duals, puis
+recalcule les injections par nœud. Les appelants n'en lisent qu'une petite
+partie : l'application trace la production, le stockage et le prix marginal,
+les balayages ne gardent que les indicateurs. L'appelant déclare ici les
+sorties voulues (OUTPUTS) :
+- "dispatch" : production, engagement et stockage (toutes les variables),
+- "prices" : prix marginal des nœuds (duale du bilan nodal),
+- "storage_values" : valeur de l'énergie stockée (duale du bilan des stockages),
+- "duals" : toutes les duales, comme assign_all_duals.
+
+Seules ces séries sont converties en DataFrame, en float32 par défaut ; les
+séries non demandées sont vidées pour ne pas laisser les valeurs d'un run
+précédent. La valeur de l'objectif est toujours relevée.
+
+Exemple :
+    network.optimize.create_model()
+    status, condition = solve_model(network, outputs=("dispatch",), solver_name="highs")
+"""
+import numpy as np
+import pandas as pd
+from instrumentation import span
+
+OUTPUTS = ("dispatch", "prices", "storage_values", "duals")
+# production, stockage et prix : ce qu'utilisent les tracés et l'historique
+DEFAULT_OUTPUTS = ("dispatch", "prices")
+# précision suffisante pour l'affichage et les indicateurs, moitié moins de mémoire
+DEFAULT_DTYPE = np.float32
+
+
+def check_outputs(outputs):
+    unknown = set(outputs) - set(OUTPUTS)
+    if unknown:
+        raise ValueError("Sorties inconnues : " + ", ".join(sorted(unknown)))
+    return tuple(outputs)
+
+
+def _dual_target(name, outputs):
+    # (composant, attribut recevant la duale, demandée ?), noms de pypsa assign_duals
+    component, attr = name.split("-", 1)
+    if attr.endswith("nodal_balance"):
+        return component, "marginal_price", "prices" in outputs or "duals" in outputs
+    wanted = "duals" in outputs or ("storage_values" in outputs and name == "StorageUnit-energy_balance")
+    return component, "mu_" + attr.rsplit("-", 1)[-1], wanted
+
+
+def _set_frame(network, component, attr, frame, dtype):
+    frame = frame.reindex(network.snapshots).fillna(0.0)
+    network.dynamic(component)[attr] = frame.astype(dtype) if dtype is not None else frame
+
+
+def _clear_frame(network, component, attr):
+    dynamic = network.dynamic(component)
+    if attr in dynamic and not dynamic[attr].empty:
+        dynamic[attr] = pd.DataFrame(index=network.snapshots)
+
+
+def extract_results(network, outputs=DEFAULT_OUTPUTS, dtype=DEFAULT_DTYPE):
+    outputs = check_outputs(outputs)
+    n, m = network, network.model
+    with span("extract", outputs=",".join(outputs)):
+        # --- Variables (cf. pypsa assign_solution, sans les lignes ni les liens) ---
+        for name, var in m.variables.items():
+            if name == "objective_constant" or "-" not in name:
+                continue
+            component, attr = name.split("-", 1)
+            if "snapshot" not in var.dims:
+                if "dispatch" in outputs and attr != "n_mod":
+                    values = var.solution.to_pandas()
+                    idx = values.index.intersection(n.static(component).index)
+                    n.static(component).loc[idx, attr + "_opt"] = values.loc[idx]
+            elif "dispatch" in outputs:
+                _set_frame(n, component, attr, var.solution.transpose("snapshot", ...).to_pandas(), dtype)
+            else:
+                _clear_frame(n, component, attr)
+
+        if "dispatch" in outputs:
+            for component, attr in (("Generator", "p_nom"), ("StorageUnit", "p_nom")):
+                fixed = n.get_non_extendable_i(component)
+                n.static(component).loc[fixed, attr + "_opt"] = n.static(component).loc[fixed, attr]
+            su = n.storage_units_t
+            if not n.storage_units.empty:
+                su["p"] = su["p_dispatch"] - su["p_store"]
+        else:
+            _clear_frame(n, "StorageUnit", "p")
+
+        # --- Duales : absentes d'un MILP ---
+        weights = n.snapshot_weightings.objective.reindex(n.snapshots)
+        for name, con in m.constraints.items():
+            if "-" not in name or "snapshot" not in con.dims:
+                continue
+            component, attr, wanted = _dual_target(name, outputs)
+            if not wanted or "dual" not in con.data:
+                _clear_frame(n, component, attr)
+                continue
+            dual = con.dual.transpose("snapshot", ...).to_pandas()
+            if attr == "marginal_price":
+                # prix par MWh : duale ramenée à la durée du pas de temps
+                dual = dual.divide(weights, axis=0)
+            _set_frame(n, component, attr, dual, dtype)
+
+        n._objective = m.objective.value
+
+
+def solve_model(network, outputs=DEFAULT_OUTPUTS, dtype=DEFAULT_DTYPE, solver_name="highs", solver_options=None,
+                **kwargs):
+    # équivalent de network.optimize.solve_model, extraction limitée aux sorties demandées
+    outputs = check_outputs(outputs)
+    status, condition = network.model.solve(solver_name=solver_name, **(solver_options or {}), **kwargs)
+    if status == "ok":
+        extract_results(network, outputs, dtype)
+    return status, condition
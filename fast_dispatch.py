@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Dispatch économique sans engagement des centrales, en LP dédié.
+
+Sur un seul bus et sans engagement des centrales (committable ignoré), le
+réseau préparé par prep_network donne un LP très structuré : production de
+chaque centrale, charge / décharge / état de charge des deux stockages,
+équilibre offre-demande à chaque heure. La matrice creuse des contraintes est
+construite directement depuis les attributs du réseau, sans passer par
+linopy, puis résolue par HiGHS via highspy. Une année complète se résout en
+quelques secondes.
+
+La formulation est celle de pypsa avec committable=False : bornes
+p_min_pu / p_max_pu, rampes, bilan du stockage (rendements, pertes, apports
+et déversement), équilibre au bus. Les résultats sont écrits dans le réseau
+comme après network.optimize ; check_objective compare l'objectif au chemin
+pypsa.
+
+Exemple :
+    python fast_dispatch.py --horizon 8760 --check
+"""
+import argparse
+import sys
+import time
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from instrumentation import record, record_result, span
+
+# nom du mode dans l'application, à côté de SOLVE_MODES (cf. solve.py)
+DISPATCH_MODE = "dispatch"
+
+
+def _dense(network, component, attr):
+    return network.get_switchable_as_dense(component, attr, network.snapshots).to_numpy(dtype=float)
+
+
+def _flat(values):
+    # (pas de temps x éléments) -> vecteur, élément par élément
+    return np.asarray(values, dtype=float).ravel(order="F")
+
+
+def _check_supported(network):
+    if len(network.buses) != 1:
+        raise ValueError("Le dispatch dédié ne traite qu'un seul bus")
+    for component in ("Line", "Link", "Store", "Transformer"):
+        if len(network.static(component)):
+            raise ValueError("Composant non géré par le dispatch dédié : " + component)
+    if network.generators.p_nom_extendable.any() or network.storage_units.p_nom_extendable.any():
+        raise ValueError("Le dispatch dédié ne traite que des capacités fixées")
+
+
+def build_dispatch_lp(network):
+    # variables, bloc par bloc, chaque bloc élément par élément puis pas de temps :
+    # p des centrales, p_dispatch, p_store, state_of_charge, spill (stockages avec apports)
+    _check_supported(network)
+    T = len(network.snapshots)
+    eh = network.snapshot_weightings.stores.to_numpy(dtype=float)
+    weight = network.snapshot_weightings.objective.to_numpy(dtype=float)
+    generators, units = network.generators, network.storage_units
+    G, S = len(generators), len(units)
+    t = np.arange(T)
+
+    p_nom = generators.p_nom.to_numpy(dtype=float)
+    s_nom = units.p_nom.to_numpy(dtype=float)
+    inflow = _dense(network, "StorageUnit", "inflow")
+    spilled = np.flatnonzero((inflow > 0).any(axis=0))
+
+    def zeros(n):
+        return np.zeros((T, n))
+
+    def cost(c, attr, n):
+        return _dense(network, c, attr)*weight[:, None] if attr in network.static(c) else zeros(n)
+
+    blocks = {
+        "p": (_dense(network, "Generator", "p_min_pu")*p_nom, _dense(network, "Generator", "p_max_pu")*p_nom,
+              cost("Generator", "marginal_cost", G)),
+        "p_dispatch": (zeros(S), _dense(network, "StorageUnit", "p_max_pu")*s_nom,
+                       cost("StorageUnit", "marginal_cost", S)),
+        "p_store": (zeros(S), -_dense(network, "StorageUnit", "p_min_pu")*s_nom, zeros(S)),
+        "state_of_charge": (zeros(S), np.broadcast_to(s_nom*units.max_hours.to_numpy(dtype=float), (T, S)),
+                            cost("StorageUnit", "marginal_cost_storage", S)),
+        "spill": (zeros(len(spilled)), inflow[:, spilled], cost("StorageUnit", "spill_cost", S)[:, spilled]),
+    }
+    start, offset = {}, 0
+    for name, (lower, _, _) in blocks.items():
+        start[name] = offset
+        offset += lower.size
+    lower, upper, col_cost = (np.concatenate([_flat(block[k]) for block in blocks.values()]) for k in range(3))
+
+    def col(name, j, steps=t):
+        return start[name] + j*T + steps
+
+    rows, cols, vals = [], [], []
+    row_lower, row_upper = [], []
+
+    def add(r, c, v):
+        rows.append(r)
+        cols.append(c)
+        vals.append(np.broadcast_to(v, np.shape(r)).astype(float))
+
+    # --- Équilibre au bus : production + décharge - charge = consommation ---
+    load = _dense(network, "Load", "p_set").sum(axis=1)
+    for j in range(G):
+        add(t, col("p", j), 1.0)
+    for j in range(S):
+        add(t, col("p_dispatch", j), 1.0)
+        add(t, col("p_store", j), -1.0)
+    row_lower.append(load)
+    row_upper.append(load)
+    n_rows = T
+
+    # --- Bilan des stockages :
+    # soc_t - pertes*soc_t-1 + eh/eff_dispatch*p_dispatch - eh*eff_store*p_store + eh*spill = eh*apports
+    eff_stand = (1 - _dense(network, "StorageUnit", "standing_loss"))**eh[:, None]
+    eff_dispatch = _dense(network, "StorageUnit", "efficiency_dispatch")
+    eff_store = _dense(network, "StorageUnit", "efficiency_store")
+    soc_initial = units.state_of_charge_initial.to_numpy(dtype=float)
+    cyclic = units.cyclic_state_of_charge.to_numpy(dtype=bool)
+    for j in range(S):
+        r = n_rows + t
+        add(r, col("state_of_charge", j), 1.0)
+        add(r, col("p_dispatch", j), eh/eff_dispatch[:, j])
+        add(r, col("p_store", j), -eh*eff_store[:, j])
+        if j in spilled:
+            add(r, start["spill"] + int(np.searchsorted(spilled, j))*T + t, eh)
+        # état précédent ; au premier pas, l'état initial passe au second membre (sauf cyclique)
+        previous = t[1:] if not cyclic[j] else t
+        add(n_rows + previous, col("state_of_charge", j, (previous - 1) % T), -eff_stand[previous, j])
+        rhs = eh*inflow[:, j]
+        if not cyclic[j]:
+            rhs[0] += soc_initial[j]
+        row_lower.append(rhs)
+        row_upper.append(rhs)
+        n_rows += T
+
+    # --- Rampes : -ramp_down*p_nom <= p_t - p_t-1 <= ramp_up*p_nom ---
+    # (ignorées par pypsa si toutes absentes ou toutes égales à 1)
+    ramp_up = _dense(network, "Generator", "ramp_limit_up")
+    ramp_down = _dense(network, "Generator", "ramp_limit_down")
+    if not (np.isnan(ramp_up).all() and np.isnan(ramp_down).all()) \
+            and not ((ramp_up == 1).all() and (ramp_down == 1).all()):
+        for j in range(G):
+            up, down = ramp_up[1:, j], ramp_down[1:, j]
+            steps = t[1:][~(np.isnan(up) & np.isnan(down))]
+            if not len(steps):
+                continue
+            r = n_rows + np.arange(len(steps))
+            add(r, col("p", j, steps), 1.0)
+            add(r, col("p", j, steps - 1), -1.0)
+            row_upper.append(np.where(np.isnan(ramp_up[steps, j]), np.inf, ramp_up[steps, j]*p_nom[j]))
+            row_lower.append(np.where(np.isnan(ramp_down[steps, j]), -np.inf, -ramp_down[steps, j]*p_nom[j]))
+            n_rows += len(steps)
+
+    matrix = sp.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(n_rows, len(lower)))
+    layout = dict(start=start, spilled=spilled, n_generators=G, n_units=S)
+    return dict(matrix=matrix, col_lower=lower, col_upper=upper, col_cost=col_cost,
+                row_lower=np.concatenate(row_lower), row_upper=np.concatenate(row_upper), layout=layout)
+
+
+def _solve_highs(lp, solver_options=None):
+    import highspy
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    for option, value in (solver_options or {}).items():
+        h.setOptionValue(option, value)
+    model = highspy.HighsLp()
+    matrix = lp["matrix"]
+    model.num_col_, model.num_row_ = matrix.shape[1], matrix.shape[0]
+    model.col_cost_, model.col_lower_, model.col_upper_ = lp["col_cost"], lp["col_lower"], lp["col_upper"]
+    model.row_lower_, model.row_upper_ = lp["row_lower"], lp["row_upper"]
+    model.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    model.a_matrix_.start_, model.a_matrix_.index_, model.a_matrix_.value_ = \
+        matrix.indptr, matrix.indices, matrix.data
+    h.passModel(model)
+    h.run()
+    status = h.getModelStatus()
+    if status == highspy.HighsModelStatus.kOptimal:
+        return "ok", "optimal", h
+    return "warning", h.modelStatusToString(status).lower(), h
+
+
+def _assign_solution(network, lp, h):
+    sns, T = network.snapshots, len(network.snapshots)
+    layout = lp["layout"]
+    solution = h.getSolution()
+    x = np.asarray(solution.col_value)
+
+    def frame(name, columns):
+        start = layout["start"][name]
+        values = x[start:start + len(columns)*T].reshape(len(columns), T).T
+        return pd.DataFrame(values, index=sns, columns=columns)
+
+    network.generators_t.p = frame("p", network.generators.index)
+    units = network.storage_units.index
+    network.storage_units_t.p_dispatch = frame("p_dispatch", units)
+    network.storage_units_t.p_store = frame("p_store", units)
+    network.storage_units_t.state_of_charge = frame("state_of_charge", units)
+    network.storage_units_t.spill = frame("spill", units[layout["spilled"]]).reindex(columns=units, fill_value=0.0)
+    network.storage_units_t.p = network.storage_units_t.p_dispatch - network.storage_units_t.p_store
+    network.loads_t.p = network.get_switchable_as_dense("Load", "p_set", sns)
+    # prix marginal : duale de l'équilibre au bus, ramenée à l'heure comme dans pypsa
+    prices = np.asarray(solution.row_dual[:T])/network.snapshot_weightings.objective.to_numpy(dtype=float)
+    network.buses_t.marginal_price = pd.DataFrame({network.buses.index[0]: prices}, index=sns)
+    # objectif posé comme le fait solve_model (le setter public est déprécié)
+    network._objective = h.getInfo().objective_function_value
+    network._objective_constant = 0.0
+
+
+def optimize_dispatch(network, solver_options=None):
+    # même retour que network.optimize : (statut, condition)
+    with span("model_build", engine="dispatch"):
+        lp = build_dispatch_lp(network)
+    record(variables=lp["matrix"].shape[1], constraints=lp["matrix"].shape[0], nonzeros=lp["matrix"].nnz,
+           binaries=0, integers=0, type="LP")
+    with span("solve", solver="highs", engine="dispatch") as attrs:
+        status, condition, h = _solve_highs(lp, solver_options)
+        attrs["status"] = status
+    if status == "ok":
+        _assign_solution(network, lp, h)
+    record_result(status, condition)
+    return status, condition
+
+
+def check_objective(network, solver_name="highs", rtol=1e-6, **kwargs):
+    # même réseau résolu par pypsa, engagement des centrales désactivé
+    reference = network.copy()
+    reference.generators["committable"] = False
+    t0 = time.perf_counter()
+    status, condition = reference.optimize(solver_name=solver_name, **kwargs)
+    pypsa_s = time.perf_counter() - t0
+    if status != "ok":
+        return {"status": status, "condition": condition}
+    gap = abs(network.objective - reference.objective)/max(abs(reference.objective), 1.0)
+    return {"dispatch_objective": network.objective, "pypsa_objective": reference.objective,
+            "relative_gap": gap, "match": gap <= rtol, "pypsa_time_s": pypsa_s}
+
+
+def main():
+    from main import prep_network
+    from sweep import DEFAULTS
+
+    parser = argparse.ArgumentParser(description="Dispatch économique sur un bus, LP dédié HiGHS")
+    parser.add_argument("--horizon", type=int, default=8760)
+    parser.add_argument("--date-debut", type=int, default=0)
+    parser.add_argument("--capa-year", type=int, default=DEFAULTS["capa_data_year"])
+    parser.add_argument("--voll", type=float, default=None, help="coût du délestage (€/MWh), rend le LP toujours faisable")
+    parser.add_argument("--check", action="store_true", help="compare l'objectif au chemin pypsa")
+    args = parser.parse_args()
+
+    params = dict(DEFAULTS, time_horizon_in_hours=args.horizon, date_debut=args.date_debut,
+                  capa_data_year=args.capa_year)
+    network = prep_network(**params, voll=args.voll)
+    t0 = time.perf_counter()
+    status, condition = optimize_dispatch(network)
+    print(f"Dispatch dédié : {status} ({condition}) en {time.perf_counter() - t0:.2f} s")
+    if status != "ok":
+        return 1
+    print(f"Objectif {network.objective:.6g}")
+    if not args.check:
+        return 0
+    report = check_objective(network)
+    if "match" not in report:
+        print(f"Chemin pypsa : {report['status']} ({report['condition']})")
+        return 1
+    print(f"Chemin pypsa : objectif {report['pypsa_objective']:.6g} en {report['pypsa_time_s']:.2f} s, "
+          f"écart relatif {report['relative_gap']:.2e}")
+    return 0 if report["match"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation légère des simulations.
+
+span("nom") chronomètre une phase (lecture des données, ajout des
+composants, construction du modèle, résolution, extraction des résultats).
+Chaque mesure est :
+- ajoutée au Run actif du thread courant (cf. recording), qui regroupe aussi
+  la taille du modèle, le statut du solveur et la mémoire de pointe,
+- agrégée dans le registre REGISTRY du processus (nombre, total, max),
+- émise en JSON sur le logger "bess.instrumentation" (niveau DEBUG).
+
+Sans Run actif, seules les deux dernières ont lieu : l'instrumentation ne
+change rien au comportement des fonctions appelées.
+"""
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+logger = logging.getLogger("bess.instrumentation")
+
+_local = threading.local()
+
+
+def peak_rss_mb():
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS ;
+    # les solveurs lancés en sous-processus (CBC, GLPK) sont comptés à part
+    unit = 1024**2 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own/unit, children/unit
+
+
+def model_stats(model):
+    def count(variables):
+        return int(sum(int((var.labels != -1).sum()) for _, var in variables.items()))
+
+    return {
+        "variables": int(model.nvars),
+        "binaries": count(model.binaries),
+        "integers": count(model.integers),
+        "constraints": int(model.ncons),
+        "nonzeros": int(sum(int((con.vars != -1).sum()) for _, con in model.constraints.items())),
+        "type": model.type,
+    }
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._counters = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            count, total, peak = self._durations.get(name, (0, 0.0, 0.0))
+            self._durations[name] = (count + 1, total + seconds, max(peak, seconds))
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            durations = {name: {"count": c, "total_s": t, "mean_s": t/c, "max_s": m}
+                         for name, (c, t, m) in self._durations.items()}
+            return {"durations": durations, "counters": dict(self._counters)}
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counters.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+
+class Run:
+
+    def __init__(self, name=""):
+        self.name = name
+        self.started = time.time()
+        self.spans = []
+        self.stats = {}
+
+    def to_dict(self):
+        rss, rss_children = peak_rss_mb()
+        return {"name": self.name, "started": self.started, "spans": self.spans, "stats": self.stats,
+                "peak_rss_mb": round(rss, 1), "peak_rss_children_mb": round(rss_children, 1)}
+
+    def durations(self):
+        # temps total par phase (une phase peut être répétée, ex. fenêtres glissantes)
+        if not self.spans:
+            return pd.Series(dtype=float)
+        spans = pd.DataFrame(self.spans)
+        return spans.groupby("name", sort=False)["duration_s"].sum()
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def recording(name="", run=None):
+    # active un Run pour le thread courant ; les recordings s'imbriquent.
+    # run permet de reprendre un Run existant (ex. extraction après une tâche de fond)
+    previous = current_run()
+    run = run if run is not None else Run(name)
+    _local.run = run
+    try:
+        yield run
+    finally:
+        _local.run = previous
+        logger.info(json.dumps({"event": "run", **run.to_dict()}, default=str))
+
+
+@contextmanager
+def span(name, **attrs):
+    # attrs peut être complété dans le bloc (ex. statut du solveur)
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        duration = time.perf_counter() - start
+        REGISTRY.observe(name, duration)
+        record = {"name": name, "duration_s": round(duration, 4), **attrs}
+        run = current_run()
+        if run is not None:
+            run.spans.append(record)
+        logger.debug(json.dumps({"event": "span", **record}, default=str))
+
+
+def record(**stats):
+    run = current_run()
+    if run is not None:
+        run.stats.update(stats)
+
+
+def record_model(model):
+    if current_run() is not None:
+        record(**model_stats(model))
+
+
+def record_result(status, condition, **extra):
+    REGISTRY.increment("solve_" + str(status))
+    record(status=status, condition=condition, **extra)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Exécution des simulations en arrière-plan.
+
+Les résolutions sont soumises à un pool borné de threads (le solveur tourne
+hors du GIL : sous-processus CBC ou HiGHS natif) et suivies par identifiant
+de tâche : état, avancement, annulation. L'interface interroge l'état de la
+tâche au lieu de bloquer la session pendant la résolution, et plusieurs
+utilisateurs partagent le même serveur sans attendre les uns derrière les
+autres au-delà du nombre maximal de résolutions simultanées
+(BESS_MAX_SOLVES).
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_CONCURRENT = int(os.environ.get("BESS_MAX_SOLVES", 2))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "en attente", "en cours", "terminée", "échec", "annulée"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+
+    def __init__(self, description="", meta=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.description = description
+        # données de l'appelant, fixées à la soumission et relues à la fin de la tâche
+        self.meta = dict(meta or {})
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def set_progress(self, progress, message=""):
+        # appelé par la tâche elle-même, c'est aussi le point d'annulation
+        self.check_cancelled()
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        self.message = message
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobManager:
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, keep_finished=100):
+        self.max_concurrent = max_concurrent
+        self.keep_finished = keep_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="solve")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, description="", meta=None, **kwargs):
+        # fn reçoit la tâche en premier argument pour signaler son avancement
+        job = Job(description, meta)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_requested:
+            job.status, job.finished = CANCELLED, time.time()
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status, job.progress = DONE, 1.0
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status, job.error = FAILED, e
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        # une tâche en attente ne démarre pas ; une tâche en cours s'arrête au
+        # prochain point de contrôle (fenêtre suivante en horizon glissant)
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            job.status, job.finished = CANCELLED, time.time()
+        return True
+
+    def jobs(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created)
+
+    def stats(self):
+        counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+        for job in self.jobs():
+            counts[job.status] += 1
+        return dict(counts, max_concurrent=self.max_concurrent)
+
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if job.done), key=lambda job: job.finished)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
+
+    def shutdown(self, wait=False):
+        for job in self.jobs():
+            self.cancel(job.id)
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Indicateurs d'un réseau résolu, calculés en une seule passe.
+
+compute_results(network) lit une fois les séries du dispatch et en dérive par
+produits matriciels NumPy tout ce qu'utilisent les tracés, l'historique et
+les runners (sweep, monte_carlo) :
+- production horaire et énergie par filière et par centrale,
+- émissions et intensité CO₂ (horaire et sur la période),
+- charge / décharge des stockages et taux de charge en %,
+- demande, bilan énergétique, statistiques du prix marginal,
+- écrêtement des productions variables (éolien, solaire...).
+
+Le post-traitement est ainsi payé une fois par run ; compute_kpis en donne le
+résumé scalaire enregistré avec chaque run.
+"""
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+# centrale fictive de délestage (cf. voll dans prep_network)
+UNSERVED = "Délestage"
+
+
+def _grouping(labels):
+    # matrice d'appartenance (éléments x groupes) : X @ M somme les colonnes par groupe,
+    # groupes triés comme avec groupby
+    codes, groups = pd.factorize(labels, sort=True)
+    matrix = np.zeros((len(labels), len(groups)))
+    matrix[np.arange(len(labels)), codes] = 1.0
+    return matrix, pd.Index(groups, name="carrier")
+
+
+def _dense(df, columns):
+    return df.reindex(columns=columns, fill_value=0.0).to_numpy(dtype=float)
+
+
+@dataclass
+class RunResults:
+    weights: pd.Series                  # durée de chaque pas (h)
+    production: pd.DataFrame            # MW par filière
+    generation_energy: pd.Series        # MWh par centrale
+    generation_emissions: pd.Series     # t CO₂ par centrale
+    emissions: pd.Series                # t CO₂ par pas de temps
+    co2_intensity: pd.Series            # g CO₂/kWh par pas de temps
+    storage_charge: pd.DataFrame        # MW par filière de stockage, négatif
+    storage_discharge: pd.DataFrame     # MW par filière de stockage, positif
+    state_of_charge_pct: pd.DataFrame   # % de la capacité énergétique, par stockage
+    cycles: pd.Series                   # cycles équivalents par stockage
+    load: pd.Series                     # MW appelés par les consommateurs
+    energy_balance: pd.Series           # MWh par filière (consommation négative)
+    prices: pd.DataFrame                # €/MWh par bus
+    curtailment: pd.DataFrame           # MW écrêtés par filière variable
+    system_cost: float
+    unserved_energy: float = None
+
+    @property
+    def demand(self):
+        # demande vue du système : consommation plus charge des stockages
+        return self.load - self.storage_charge.sum(axis=1)
+
+    @property
+    def energy_by_carrier(self):
+        return self.production.mul(self.weights, axis=0).sum()
+
+    @property
+    def co2_total(self):
+        return float(self.emissions @ self.weights)
+
+    @property
+    def co2_intensity_mean(self):
+        # g CO₂/kWh sur toute la période
+        energy = float(self.production.sum(axis=1) @ self.weights)
+        return self.co2_total/energy*1000 if energy else float("nan")
+
+    def price_stats(self):
+        values = self.prices.to_numpy().ravel()
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return {}
+        return {"price_mean": float(values.mean()), "price_min": float(values.min()),
+                "price_max": float(values.max()), "price_std": float(values.std()),
+                "price_p95": float(np.percentile(values, 95))}
+
+    def kpis(self):
+        kpis = {"co2_total": self.co2_total, "system_cost": self.system_cost,
+                "co2_intensity": self.co2_intensity_mean,
+                "curtailment": float(self.curtailment.sum(axis=1) @ self.weights)}
+        for name, cycles in self.cycles.items():
+            kpis["cycles_" + name] = float(cycles)
+        if self.unserved_energy is not None:
+            kpis["unserved_energy"] = self.unserved_energy
+        kpis.update(self.price_stats())
+        return kpis
+
+
+def compute_results(network):
+    snapshots = network.snapshots
+    weights = network.snapshot_weightings.generators
+    w = weights.to_numpy()
+
+    # --- Générateurs ---
+    generators = network.generators
+    p = _dense(network.generators_t.p, generators.index)
+    to_carrier, carriers = _grouping(generators.carrier)
+    co2 = generators.carrier.map(network.carriers.co2_emissions).fillna(0).to_numpy(dtype=float)
+    emissions = p @ co2
+    total = p.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        intensity = emissions/total*1000
+
+    # --- Écrêtement : disponible (p_max_pu variable x p_nom) moins produit ---
+    variable = network.generators_t.p_max_pu.columns.intersection(generators.index)
+    available = network.generators_t.p_max_pu[variable].to_numpy(dtype=float)*generators.p_nom[variable].to_numpy()
+    curtailed = np.clip(available - _dense(network.generators_t.p, variable), 0, None)
+    to_variable, variable_carriers = _grouping(generators.carrier[variable])
+
+    # --- Stockage ---
+    units = network.storage_units
+    sp = _dense(network.storage_units_t.p, units.index)
+    to_storage, storage_carriers = _grouping(units.carrier)
+    charge, discharge = np.clip(sp, None, 0), np.clip(sp, 0, None)
+    capacity = (units.p_nom*units.max_hours).to_numpy(dtype=float)
+    soc = _dense(network.storage_units_t.state_of_charge, units.index)
+    soc_pct = np.divide(soc*100, capacity, out=soc.copy(), where=capacity > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cycles = (network.snapshot_weightings.stores.to_numpy() @ discharge)/capacity
+
+    # --- Consommation et bilan ---
+    load = network.loads_t.p_set.sum(axis=1).reindex(snapshots, fill_value=0.0)
+    load_energy = network.loads_t.p_set.mul(weights, axis=0).sum().groupby(network.loads.carrier).sum()
+    energy_balance = pd.concat([pd.Series(w @ p @ to_carrier, index=carriers),
+                                pd.Series(w @ sp @ to_storage, index=storage_carriers),
+                                -load_energy])
+    # filières sans énergie écartées, comme dans network.statistics.energy_balance
+    energy_balance = energy_balance.groupby(level=0).sum().rename_axis("carrier")
+    energy_balance = energy_balance[energy_balance != 0]
+
+    unserved = None
+    if UNSERVED in generators.index:
+        unserved = float(p[:, generators.index.get_loc(UNSERVED)] @ w)
+
+    def frame(values, columns):
+        return pd.DataFrame(values, index=snapshots, columns=columns)
+
+    return RunResults(
+        weights=weights,
+        production=frame(p @ to_carrier, carriers),
+        generation_energy=pd.Series(w @ p, index=generators.index),
+        generation_emissions=pd.Series(w @ (p*co2), index=generators.index),
+        emissions=pd.Series(emissions, index=snapshots),
+        co2_intensity=pd.Series(intensity, index=snapshots),
+        storage_charge=frame(charge @ to_storage, storage_carriers),
+        storage_discharge=frame(discharge @ to_storage, storage_carriers),
+        state_of_charge_pct=frame(soc_pct, units.index),
+        cycles=pd.Series(cycles, index=units.index),
+        load=load,
+        energy_balance=energy_balance,
+        prices=network.buses_t.marginal_price,
+        curtailment=frame(curtailed @ to_variable, variable_carriers),
+        system_cost=float(network.objective),
+        unserved_energy=unserved,
+    )
+
+
+def compute_kpis(network):
+    return compute_results(network).kpis()
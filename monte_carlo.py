@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Évaluation d'un scénario de capacités sur toutes les années climatiques.
+
+Le même scénario (année de capacité ERAA + stockage) est simulé pour chaque
+année de données (2025, 2028, 2030, 2033) et chaque année climatique
+disponible (1982, 1986, 2000, 2006, 2012). Les séries sont converties une
+seule fois au format binaire puis partagées en mémoire mappée par les
+workers ; les runs indépendants sont résolus en parallèle.
+
+Le résultat est la distribution (moyenne, P10, P90) du CO2, du coût, de
+l'énergie non servie et de l'utilisation des stockages.
+
+Exemple :
+    python monte_carlo.py --capa-year 2030 --horizon 168 --date-debut 0 --workers 20
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+import pandas as pd
+from extraction import solve_model
+from kpi import compute_kpis
+from main import prep_network
+from network_template import STORAGE_PARAMS
+from result_store import STORE, network_timeseries
+from solve import SolverConfig, check_solution
+from sweep import DEFAULTS
+from timeseries_store import DATA_YEARS, climatic_years, ensure_ingested
+
+# énergie non distribuée, €/MWh
+DEFAULT_VOLL = 3000
+
+KPIS = (["co2_total", "system_cost", "unserved_energy", "co2_intensity", "curtailment"]
+        + ["cycles_" + name for name in STORAGE_PARAMS])
+FIELDS = ["climatic_data_year", "clim_year", "status", "condition"] + KPIS + ["wall_time_s"]
+
+
+def run_case(params, solver_name="cbc", threads=1, voll=DEFAULT_VOLL, rolling=None, time_limit=None,
+             mip_rel_gap=None, keep_timeseries=False):
+    start = time.perf_counter()
+    config = SolverConfig(solver_name, threads=threads or None, time_limit=time_limit, mip_rel_gap=mip_rel_gap)
+
+    if rolling:
+        from rolling_horizon import optimize_rolling_horizon
+        horizon, overlap = rolling
+        network = prep_network(**params, commitment_window=horizon, voll=voll)
+        status, condition = optimize_rolling_horizon(network, horizon=horizon, overlap=overlap,
+                                                     **config.solve_kwargs())
+    else:
+        network = prep_network(**params, voll=voll)
+        network.optimize.create_model()
+        # les prix ne sont relus que s'ils sont enregistrés avec les séries
+        outputs = ("dispatch", "prices") if keep_timeseries else ("dispatch",)
+        status, condition = check_solution(network, *solve_model(network, outputs, **config.solve_kwargs()))
+
+    row = dict(climatic_data_year=params["climatic_data_year"], clim_year=params["clim_year"],
+               status=status, condition=condition)
+    if status == "ok":
+        row.update(compute_kpis(network))
+        if keep_timeseries:
+            row["timeseries"] = network_timeseries(network)
+    row["wall_time_s"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def summarize(results):
+    # moyenne, P10 et P90 par année de données, puis sur l'ensemble des runs
+    ok = results[results["status"] == "ok"]
+    groups = [(year, group) for year, group in ok.groupby("climatic_data_year")] + [("toutes", ok)]
+    rows = []
+    for year, group in groups:
+        for kpi in KPIS:
+            values = group[kpi].astype(float)
+            rows.append({"climatic_data_year": year, "kpi": kpi, "runs": len(values), "mean": values.mean(),
+                         "p10": values.quantile(0.1), "p90": values.quantile(0.9)})
+    return pd.DataFrame(rows)
+
+
+def run_monte_carlo(output="monte_carlo_runs.csv", data_years=DATA_YEARS, clim_years=None, workers=None,
+                    threads=1, solver_name="cbc", voll=DEFAULT_VOLL, rolling=None, time_limit=None,
+                    mip_rel_gap=None, store=None, **scenario):
+    base = dict(DEFAULTS)
+    base.update(scenario)
+
+    # conversion binaire faite une fois ici plutôt que par chaque worker
+    cases = []
+    for data_year in data_years:
+        ensure_ingested(data_year)
+        for clim_year in (clim_years or climatic_years(data_year)):
+            cases.append(dict(base, climatic_data_year=data_year, clim_year=clim_year))
+
+    rows = []
+    with open(output, "w", newline="") as f, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool, \
+            (store.writer() if store is not None else nullcontext()) as store_writer:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        futures = {pool.submit(run_case, case, solver_name, threads, voll, rolling, time_limit, mip_rel_gap,
+                               store is not None): case
+                   for case in cases}
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                row = future.result()
+            except Exception as e:
+                case = futures[future]
+                row = dict(climatic_data_year=case["climatic_data_year"], clim_year=case["clim_year"],
+                           status="error", condition=str(e))
+            if store_writer is not None:
+                store_writer.add_row(futures[future], row, source="monte_carlo", solver=solver_name, voll=voll)
+                row.pop("timeseries", None)
+            rows.append(row)
+            writer.writerow(row)
+            f.flush()
+            print(f"[{i}/{len(cases)}] {row['climatic_data_year']}/{row['clim_year']} : {row['status']}")
+
+    results = pd.DataFrame(rows, columns=FIELDS)
+    return results, summarize(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scénario évalué sur toutes les années climatiques")
+    parser.add_argument("--capa-year", type=int, default=DEFAULTS["capa_data_year"])
+    parser.add_argument("--data-years", type=int, nargs="+", default=DATA_YEARS)
+    parser.add_argument("--clim-years", type=int, nargs="+", default=None)
+    parser.add_argument("--horizon", type=int, default=DEFAULTS["time_horizon_in_hours"])
+    parser.add_argument("--date-debut", type=int, default=DEFAULTS["date_debut"])
+    parser.add_argument("--demand-multiplier", type=float, default=DEFAULTS["demand_multiplier"])
+    parser.add_argument("--charge-initiale", type=float, default=DEFAULTS["charge_initiale_stockage"])
+    for name in ("p_bat", "capa_bat", "p_hyd", "capa_hyd"):
+        parser.add_argument("--" + name.replace("_", "-"), type=float, default=DEFAULTS[name])
+    parser.add_argument("--voll", type=float, default=DEFAULT_VOLL, help="coût du délestage (€/MWh)")
+    parser.add_argument("--rolling", type=int, nargs=2, metavar=("FENETRE", "RECOUVREMENT"), default=None,
+                        help="horizon glissant, par ex. --rolling 168 24")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--solver", default="cbc")
+    parser.add_argument("--time-limit", type=float, default=None, help="limite de temps par run (s)")
+    parser.add_argument("--mip-gap", type=float, default=None, help="écart MIP relatif accepté")
+    parser.add_argument("--output", default="monte_carlo_runs.csv")
+    parser.add_argument("--store", action="store_true", help="ajoute les runs au stockage Parquet (result_store)")
+    parser.add_argument("--summary", default="monte_carlo_summary.csv")
+    args = parser.parse_args()
+
+    results, summary = run_monte_carlo(
+        output=args.output, data_years=args.data_years, clim_years=args.clim_years, workers=args.workers,
+        threads=args.threads, solver_name=args.solver, voll=args.voll, rolling=args.rolling,
+        time_limit=args.time_limit, mip_rel_gap=args.mip_gap, store=STORE if args.store else None,
+        capa_data_year=args.capa_year, time_horizon_in_hours=args.horizon, date_debut=args.date_debut,
+        demand_multiplier=args.demand_multiplier, charge_initiale_stockage=args.charge_initiale,
+        p_bat=args.p_bat, capa_bat=args.capa_bat, p_hyd=args.p_hyd, capa_hyd=args.capa_hyd)
+    summary.to_csv(args.summary, index=False)
+    print(summary.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Réseau paramétrique : construit une fois, re-résolu avec d'autres paramètres.
+
+Le réseau est construit une seule fois pour une combinaison (année de
+capacité, année climatique), sur toute l'année (cf. windowed_network.py).
+Changer le stockage, la charge initiale ou la demande ne modifie ensuite que
+les bornes et seconds membres concernés du modèle linopy avant de relancer le
+solveur ; déplacer ou allonger la fenêtre simulée re-découpe les séries déjà
+chargées et ne reconstruit que le modèle.
+"""
+import time
+from extraction import DEFAULT_OUTPUTS, solve_model
+from instrumentation import record_model, record_result, span
+from windowed_network import WindowedNetwork
+from solve import SOLVE_MODES, check_solution, mip_gap, warm_started
+
+# paramètres qui imposent de reconstruire le réseau
+STRUCTURAL_PARAMS = ("climatic_data_year", "clim_year", "capa_data_year")
+# fenêtre simulée : le réseau est gardé, seul le modèle est reconstruit
+WINDOW_PARAMS = ("time_horizon_in_hours", "date_debut")
+# paramètres modifiables sans reconstruction
+UPDATABLE_PARAMS = ("demand_multiplier", "p_bat", "capa_bat", "p_hyd", "capa_hyd", "charge_initiale_stockage")
+
+# unité de stockage -> (puissance, capacité) dans les paramètres de prep_network
+STORAGE_PARAMS = {
+    "Batteries": ("p_bat", "capa_bat"),
+    "Hydro - pompage": ("p_hyd", "capa_hyd"),
+}
+
+
+class NetworkTemplate:
+
+    def __init__(self, time_horizon_in_hours, date_debut, demand_multiplier, climatic_data_year, clim_year,
+                 capa_data_year, p_bat, capa_bat, p_hyd, capa_hyd, charge_initiale_stockage, mode="exact"):
+        self.params = dict(time_horizon_in_hours=time_horizon_in_hours, date_debut=date_debut,
+                           demand_multiplier=demand_multiplier, climatic_data_year=climatic_data_year,
+                           clim_year=clim_year, capa_data_year=capa_data_year, p_bat=p_bat, capa_bat=capa_bat,
+                           p_hyd=p_hyd, capa_hyd=capa_hyd, charge_initiale_stockage=charge_initiale_stockage)
+        self.windowed = WindowedNetwork(**self.params)
+        self.network = self.windowed.network
+        # le mode de résolution (cf. solve.py) est fixé à la construction du modèle
+        self.mode = mode
+        self._build_model()
+
+    def _build_model(self):
+        with span("model_build"):
+            self.model = self.network.optimize.create_model(**SOLVE_MODES[self.mode])
+        # démarrage à chaud : résultats de la dernière résolution réussie et
+        # temps de la dernière résolution à froid, pour estimer le gain
+        self.solved = False
+        self.cold_solve_s = None
+        self.last_warm_start = None
+        record_model(self.model)
+
+    @property
+    def key(self):
+        return tuple(self.params[p] for p in STRUCTURAL_PARAMS)
+
+    def matches(self, **params):
+        return all(self.params[p] == params[p] for p in STRUCTURAL_PARAMS if p in params)
+
+    def update(self, **params):
+        unknown = set(params) - set(STRUCTURAL_PARAMS) - set(WINDOW_PARAMS) - set(UPDATABLE_PARAMS)
+        if unknown:
+            raise TypeError("Paramètres inconnus : " + ", ".join(sorted(unknown)))
+        if not self.matches(**params):
+            raise ValueError("Ces paramètres changent la structure du réseau, il faut un nouveau NetworkTemplate.")
+
+        changed = {p: v for p, v in params.items()
+                   if p in WINDOW_PARAMS + UPDATABLE_PARAMS and self.params[p] != v}
+        if not changed:
+            return self
+        self.params.update(changed)
+        date_debut, hours = self.params["date_debut"], self.params["time_horizon_in_hours"]
+        if changed.keys() & set(WINDOW_PARAMS) and \
+                len(self.windowed.window(date_debut, hours)) != len(self.network.snapshots):
+            # durée différente : séries re-découpées puis modèle reconstruit,
+            # les autres paramètres sont appliqués directement au réseau
+            self.windowed.set_window(date_debut, hours, self.params["demand_multiplier"])
+            self._set_storage()
+            self._build_model()
+            return self
+        if changed.keys() & {"p_bat", "capa_bat", "p_hyd", "capa_hyd", "charge_initiale_stockage"}:
+            self._update_storage()
+        if "date_debut" in changed:
+            self._shift_window()
+        elif "demand_multiplier" in changed:
+            self._update_load()
+        return self
+
+    def _shift_window(self):
+        # même durée : le modèle est gardé, ses pas de temps renommés et les
+        # séries de la nouvelle fenêtre reportées dans les seconds membres
+        n, m = self.network, self.model
+        old_snapshots, old_p_set = n.snapshots, n.loads_t.p_set
+        self.windowed.set_window(self.params["date_debut"], self.params["time_horizon_in_hours"],
+                                 self.params["demand_multiplier"])
+        sns = n.snapshots
+        with span("window_shift"):
+            for items in (m.variables, m.constraints):
+                for item in items.data.values():
+                    if "snapshot" in item.data.dims:
+                        # certaines contraintes (rampes, temps minimaux) ne portent que sur une partie des pas
+                        position = old_snapshots.get_indexer(item.data.indexes["snapshot"])
+                        # ordre des coordonnées conservé : linopy en déduit l'ordre des dimensions
+                        coords = {k: (v.dims, sns[position] if k == "snapshot" else v.values)
+                                  for k, v in item.data.coords.items()}
+                        item._data = item.data.drop_vars(list(coords)).assign_coords(coords)
+            # pas de temps relus par pypsa pour ranger la solution
+            m.parameters = m.parameters.assign(snapshots=sns)
+
+            # bornes des centrales non pilotables : p_max_pu variable de l'éolien et du solaire
+            from pypsa.descriptors import get_bounds_pu
+            for bound in ("lower", "upper"):
+                con = m.constraints["Generator-fix-p-" + bound]
+                names = con.rhs.indexes["Generator-fix"]
+                min_pu, max_pu = get_bounds_pu(n, "Generator", sns, names, "p")
+                pu = min_pu if bound == "lower" else max_pu
+                con.rhs = con.rhs.copy(data=pu.mul(n.generators.p_nom.reindex(names)).values)
+            self._update_load(old_p_set)
+        # la solution précédente porte sur une autre période
+        self.solved = False
+
+    def _update_storage(self):
+        n, m = self.network, self.model
+        su = n.storage_units
+        sns = n.snapshots
+        old_soc_initial = su.state_of_charge_initial.copy()
+        self._set_storage()
+
+        # bornes des unités non extensibles : min_pu/max_pu * p_nom (cf. pypsa)
+        from pypsa.descriptors import get_bounds_pu
+        for attr in ("p_dispatch", "p_store", "state_of_charge"):
+            for bound in ("lower", "upper"):
+                con = m.constraints["StorageUnit-fix-" + attr + "-" + bound]
+                names = con.rhs.indexes["StorageUnit-fix"]
+                min_pu, max_pu = get_bounds_pu(n, "StorageUnit", sns, names, attr)
+                pu = min_pu if bound == "lower" else max_pu
+                con.rhs = con.rhs.copy(data=pu.mul(su.p_nom.reindex(names)).values)
+
+        # la charge initiale n'intervient que dans le bilan du premier pas de temps
+        con = m.constraints["StorageUnit-energy_balance"]
+        names = con.rhs.indexes["StorageUnit"]
+        non_cyclic = ~su.cyclic_state_of_charge.reindex(names)
+        eh = n.snapshot_weightings.stores.iloc[0]
+        standing = (1 - su.standing_loss.reindex(names))**eh
+        delta = ((su.state_of_charge_initial - old_soc_initial).reindex(names)*standing).where(non_cyclic, 0)
+        rhs = con.rhs.values.copy()
+        rhs[0, :] -= delta.values
+        con.rhs = con.rhs.copy(data=rhs)
+
+    def _set_storage(self):
+        su = self.network.storage_units
+        for name, (p_param, capa_param) in STORAGE_PARAMS.items():
+            p_nom, capa = self.params[p_param], self.params[capa_param]
+            su.loc[name, "p_nom"] = p_nom
+            su.loc[name, "max_hours"] = capa/p_nom
+            su.loc[name, "state_of_charge_initial"] = capa*self.params["charge_initiale_stockage"]
+
+    def _update_load(self, old_p_set=None):
+        # old_p_set : demande ayant servi au second membre actuel, alignée par position
+        n, m = self.network, self.model
+        old_p_set = n.loads_t.p_set if old_p_set is None else old_p_set
+        self.windowed.demand_multiplier = self.params["demand_multiplier"]
+        new_p_set = self.windowed.base_load*self.params["demand_multiplier"]
+        # les charges apparaissent au second membre avec le signe opposé à n.loads.sign
+        delta = ((new_p_set - old_p_set.set_axis(new_p_set.index))*-n.loads.sign).T.groupby(n.loads.bus).sum().T
+        n.loads_t.p_set = new_p_set
+
+        con = m.constraints["Bus-nodal_balance"]
+        buses = con.rhs.indexes["Bus"]
+        rhs = con.rhs.values + delta.reindex(columns=buses, fill_value=0).T.values
+        con.rhs = con.rhs.copy(data=rhs)
+
+    def optimize(self, solver_name="cbc", warm_start=False, outputs=DEFAULT_OUTPUTS, **kwargs):
+        # warm_start : la solution précédente (engagement, production, stockage)
+        # sert de solution de départ, le modèle étant identique aux bornes près ;
+        # outputs : résultats recopiés dans le réseau (cf. extraction.py)
+        with warm_started(self.network, self.model, solver_name, warm_start and self.solved,
+                          **kwargs) as (solve_kwargs, started):
+            t0 = time.perf_counter()
+            with span("solve", solver=solver_name, warm_start=started) as attrs:
+                status, condition = check_solution(self.network, *solve_model(
+                    self.network, outputs, solver_name=solver_name, **solve_kwargs))
+                attrs["status"] = status
+            elapsed = time.perf_counter() - t0
+
+        extra = {}
+        if not started:
+            self.cold_solve_s, self.last_warm_start = elapsed, None
+        elif self.cold_solve_s is not None:
+            # estimation : la dernière résolution à froid de ce modèle portait sur d'autres
+            # paramètres (cf. solve.warm_start_report pour une mesure sur les mêmes)
+            self.last_warm_start = dict(solve_s=elapsed, cold_solve_s=self.cold_solve_s,
+                                        saved_s_estimate=self.cold_solve_s - elapsed)
+            extra = {"warm_start_saved_s_estimate": round(self.last_warm_start["saved_s_estimate"], 3)}
+        self.solved = status == "ok"
+        record_result(status, condition, mip_gap=mip_gap(self.network), **extra)
+        return status, condition
+
+    def result_network(self):
+        # copie du réseau résolu, sans le modèle linopy : le réseau du gabarit est modifié
+        # en place par la résolution suivante, la copie reste lisible (tracés, exports)
+        n = self.network
+        # pypsa refuse de copier un réseau auquel le modèle résolu est attaché
+        model, n._model = n._model, None
+        try:
+            return n.copy()
+        finally:
+            n._model = model
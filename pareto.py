@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Dimensionnement optimal du stockage : front de Pareto coût / CO₂.
+
+Au lieu de balayer des tailles de stockage (sweep.py), la puissance et
+l'énergie des deux stockages deviennent des variables du modèle, avec des
+coûts d'investissement annualisés (STORAGE_EXPANSION) ramenés à la durée
+simulée. Le front est ensuite tracé sur un seul modèle :
+- "epsilon" : coût minimal sous un plafond d'émissions, du plafond le plus
+  bas (émissions minimales) au plus haut (optimum économique sans plafond),
+- "weighted" : coût + prix du CO₂ x émissions, pour une liste de prix.
+
+Seul le second membre du plafond (ou le poids du CO₂) change d'un point à
+l'autre : chaque point repart de la solution du précédent. En "epsilon", les
+plafonds sont parcourus en croissant, si bien que la solution précédente est
+toujours réalisable.
+
+Exemple :
+    python pareto.py --horizon 168 --date-debut 2880 --points 8 --output pareto.csv
+    python pareto.py --method weighted --co2-prices 0 50 100 200 500
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from instrumentation import record_model, span
+from kpi import compute_results
+from main import prep_network
+from network_template import STORAGE_PARAMS
+from result_store import STORE
+from solve import SOLVE_MODES, check_solution, default_solver, warm_started
+
+# coûts annualisés (ordres de grandeur : annuité de l'investissement + maintenance)
+# et bornes des capacités, reprises des curseurs de l'application
+STORAGE_EXPANSION = {
+    "Batteries": dict(power_cost=15e3, energy_cost=30e3, p_nom_max=2000, e_nom_max=20000),
+    "Hydro - pompage": dict(power_cost=80e3, energy_cost=1e3, p_nom_max=4000, e_nom_max=200000),
+}
+
+
+class ExpansionModel:
+    # réseau et modèle linopy avec stockages extensibles, plafond de CO₂ modifiable
+
+    def __init__(self, params, mode="exact", expansion=STORAGE_EXPANSION):
+        self.params = dict(params)
+        self.network = n = prep_network(**params)
+        su = n.storage_units
+        # coûts annuels ramenés à la période simulée
+        self.period_share = float(n.snapshot_weightings.objective.sum())/8760
+        names = [name for name in su.index if name in expansion]
+        for name in names:
+            su.loc[name, "p_nom_extendable"] = True
+            su.loc[name, "p_nom_min"] = 0.0
+            su.loc[name, "p_nom_max"] = expansion[name]["p_nom_max"]
+            su.loc[name, "capital_cost"] = expansion[name]["power_cost"]*self.period_share
+            # rien d'existant : pypsa déduirait sinon le coût de p_nom de l'objectif
+            su.loc[name, "p_nom"] = 0.0
+            # l'énergie initiale ne peut être fixée en MWh si la capacité est libre
+            su.loc[name, "cyclic_state_of_charge"] = True
+        self.energy_cost = pd.Series({name: expansion[name]["energy_cost"]*self.period_share for name in names})
+
+        with span("model_build", mode=mode):
+            self.model = m = n.optimize.create_model(**SOLVE_MODES[mode])
+            # énergie découplée de la puissance : soc <= e_nom au lieu de soc <= max_hours*p_nom
+            import xarray as xr
+            coords = {"StorageUnit": pd.Index(names, name="StorageUnit")}
+            self.e_nom = m.add_variables(lower=0, upper=xr.DataArray([expansion[k]["e_nom_max"] for k in names],
+                                                                      coords=coords),
+                                         coords=[coords["StorageUnit"]], name="StorageUnit-e_nom")
+            m.remove_constraints("StorageUnit-ext-state_of_charge-upper")
+            m.add_constraints(m["StorageUnit-state_of_charge"].sel(StorageUnit=names) - self.e_nom <= 0,
+                              name="StorageUnit-ext-state_of_charge-e_nom")
+            self.cost = m.objective.expression + (self.e_nom*xr.DataArray(self.energy_cost.values,
+                                                                          coords=coords)).sum()
+            m.objective = self.cost
+
+            # émissions comptées comme dans kpi.py : production x contenu CO₂ de la filière
+            gens = n.generators
+            co2 = gens.carrier.map(n.carriers.co2_emissions).fillna(0)
+            weights = xr.DataArray(n.snapshot_weightings.generators.values, coords={"snapshot": n.snapshots})
+            self.emissions = (m["Generator-p"]*xr.DataArray(co2.values, coords={"Generator": gens.index})
+                              * weights).sum()
+            # plafond initialement inactif : émissions de toutes les centrales à pleine puissance
+            self.co2_bound = float((n.get_switchable_as_dense("Generator", "p_max_pu").mul(gens.p_nom)
+                                    .mul(co2).sum(axis=1)*n.snapshot_weightings.generators).sum()) + 1
+            m.add_constraints(self.emissions <= self.co2_bound, name="GlobalConstraint-co2_cap")
+        record_model(m)
+        self.solved = False
+        # en LP, une solution de départ désactive le presolve de HiGHS et ralentit la résolution :
+        # démarrage à chaud réservé au MILP (engagement des centrales)
+        self.is_mip = len(m.binaries) + len(m.integers) > 0
+
+    def set_cap(self, cap):
+        con = self.model.constraints["GlobalConstraint-co2_cap"]
+        con.rhs = con.rhs.copy(data=self.co2_bound if cap is None else cap)
+
+    def set_objective(self, co2_price=0.0, minimize_co2=False):
+        # coût ou émissions seules (recherche des émissions minimales)
+        if minimize_co2:
+            self.model.objective = self.emissions
+        else:
+            self.model.objective = self.cost + co2_price*self.emissions if co2_price else self.cost
+
+    def solve(self, solver_name, warm_start=True, **kwargs):
+        n = self.network
+        warm = warm_start and self.solved and self.is_mip
+        with warm_started(n, self.model, solver_name, warm, **kwargs) as (solve_kwargs, started):
+            with span("solve", solver=solver_name, warm_start=started) as attrs:
+                status, condition = check_solution(n, *n.optimize.solve_model(solver_name=solver_name,
+                                                                               **solve_kwargs))
+                attrs["status"] = status
+        self.solved = self.solved or status == "ok"
+        return status, condition
+
+    def point(self):
+        # capacités retenues, coûts et émissions de la dernière solution
+        n = self.network
+        su = n.storage_units
+        e_nom = self.e_nom.solution.to_pandas()
+        operational = float(n.generators_t.p.mul(n.generators.marginal_cost).sum(axis=1)
+                            @ n.snapshot_weightings.objective)
+        capital = float((su.capital_cost*su.p_nom_opt).sum() + (self.energy_cost*e_nom).sum())
+        row = dict(co2_total=compute_results(n).co2_total, system_cost=operational + capital,
+                   operational_cost=operational, capital_cost=capital)
+        for name, (p_param, capa_param) in STORAGE_PARAMS.items():
+            # les -0 du solveur arrondis à 0
+            row[p_param] = max(float(su.p_nom_opt[name]), 0.0) + 0.0
+            row[capa_param] = max(float(e_nom.get(name, su.p_nom[name]*su.max_hours[name])), 0.0) + 0.0
+        return row
+
+
+def pareto_front(params, points=8, method="epsilon", co2_prices=None, solver_name=None, mode="exact",
+                 expansion=STORAGE_EXPANSION, warm_start=True, store=None, **kwargs):
+    solver_name = solver_name or default_solver()
+    model = ExpansionModel(params, mode, expansion)
+    rows = []
+
+    def solve_point(**point):
+        t0 = time.perf_counter()
+        status, condition = model.solve(solver_name, warm_start, **kwargs)
+        row = dict(point=len(rows), method=method, co2_cap=None, co2_price=None)
+        row.update(point, status=status, condition=condition)
+        if status == "ok":
+            row.update(model.point())
+        row["solve_s"] = round(time.perf_counter() - t0, 3)
+        rows.append(row)
+        print(f"Point {row['point']} : {status}, CO₂ {row.get('co2_total', float('nan')):.0f} t, "
+              f"coût {row.get('system_cost', float('nan')):.4g} € ({row['solve_s']:.1f} s)")
+        return row
+
+    if method == "weighted":
+        for price in (co2_prices if co2_prices is not None else [0, 50, 100, 200, 500]):
+            model.set_objective(co2_price=price)
+            solve_point(co2_price=price)
+    elif method == "epsilon":
+        # extrémités : optimum économique sans plafond, puis émissions minimales
+        high = solve_point()
+        if high["status"] != "ok":
+            return pd.DataFrame(rows)
+        model.set_objective(minimize_co2=True)
+        status, condition = model.solve(solver_name, warm_start, **kwargs)
+        model.set_objective()
+        if status != "ok":
+            return pd.DataFrame(rows)
+        low = compute_results(model.network).co2_total
+        # plafonds croissants : la solution précédente respecte toujours le plafond suivant ;
+        # le plafond le plus bas est desserré de 0,1 % pour rester numériquement faisable
+        caps = np.linspace(low + 1e-3*max(abs(low), 1.0), high["co2_total"], points)[:-1]
+        for cap in caps:
+            model.set_cap(cap)
+            solve_point(co2_cap=float(cap))
+        rows.append(rows.pop(0))
+    else:
+        raise ValueError("Méthode inconnue : " + str(method))
+
+    frontier = pd.DataFrame(rows)
+    frontier["point"] = range(len(frontier))
+    if store is not None:
+        with store.writer() as writer:
+            for row in rows:
+                sizes = {p: row[p] for pair in STORAGE_PARAMS.values() for p in pair if p in row}
+                writer.add_row(dict(params, **sizes), row, source="pareto", solver=solver_name, mode=mode)
+    return frontier
+
+
+def main():
+    from sweep import DEFAULTS
+
+    parser = argparse.ArgumentParser(description="Front de Pareto coût / CO₂ du dimensionnement du stockage")
+    parser.add_argument("--horizon", type=int, default=DEFAULTS["time_horizon_in_hours"])
+    parser.add_argument("--date-debut", type=int, default=DEFAULTS["date_debut"])
+    parser.add_argument("--capa-year", type=int, default=DEFAULTS["capa_data_year"])
+    parser.add_argument("--method", choices=["epsilon", "weighted"], default="epsilon")
+    parser.add_argument("--points", type=int, default=8, help="nombre de points du front (epsilon)")
+    parser.add_argument("--co2-prices", type=float, nargs="+", default=None, help="€/t CO₂ (weighted)")
+    parser.add_argument("--mode", choices=list(SOLVE_MODES), default="exact")
+    parser.add_argument("--solver", default=None)
+    parser.add_argument("--no-warm-start", action="store_true")
+    parser.add_argument("--output", default="pareto.csv")
+    parser.add_argument("--store", action="store_true", help="ajoute les points au stockage Parquet des runs")
+    args = parser.parse_args()
+
+    params = dict(DEFAULTS, time_horizon_in_hours=args.horizon, date_debut=args.date_debut,
+                  capa_data_year=args.capa_year)
+    frontier = pareto_front(params, args.points, args.method, args.co2_prices, args.solver, args.mode,
+                            warm_start=not args.no_warm_start, store=STORE if args.store else None)
+    frontier.to_csv(args.output, index=False)
+    print(frontier.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+    print("Front écrit dans " + args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Tracés des résultats (Plotly pour l'application, matplotlib pour l'analyse).
+
+Séparés de main.py : les workers de calcul et les scripts en ligne de
+commande n'importent ni matplotlib ni Plotly. main.py renvoie vers ce module
+à la première utilisation d'un plot_*.
+"""
+import matplotlib.pyplot as plt
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from data_cache import get_capacities
+from downsampling import MAX_POINTS, bucket_means, decimate, minmax_indices, period_rule, resample_sum, use_webgl
+from kpi import compute_results
+
+
+def plot_results_plotly(network, results=None):
+    results = compute_results(network) if results is None else results
+    
+    COLOR_MAP = {
+        "Gas ": "black",
+        "Hydro - Run of River (Turbine)": "royalblue",
+        "Nuclear": "orange",
+        "Oil": "black",
+        "Others renewable" : "forestgreen",
+        "Solar (Photovoltaic)" : "gold",
+        "Wind Offshore": "skyblue",
+        "Wind Onshore": "navy",
+        "Stockage-bat (décharge)" : "crimson",
+        "Stockage-bat (charge)"  : "crimson",
+        "Stockage-hydro (décharge)": "mediumorchid",
+        "Stockage-hydro (charge)"  : "mediumorchid"
+    }
+
+    # --- Production par filière et stockage séparé en charge / décharge (cf. kpi.py) ---
+    all_prod = results.production.join(results.storage_discharge.add_suffix(" (décharge)"))
+    all_neg = results.storage_charge.add_suffix(" (charge)")
+
+    # --- Courbe de demande ---
+    demand = results.demand
+
+    # horizons longs : moyennes par paquets, mêmes abscisses pour toutes les aires
+    all_prod, all_neg, demand = bucket_means(all_prod), bucket_means(all_neg), bucket_means(demand)
+    webgl = use_webgl(len(demand))
+    Trace = go.Scattergl if webgl else go.Scatter
+
+    # ---------------------
+    # Construction du graphique Plotly
+    # ---------------------
+    fig = go.Figure()
+
+    # --- Stack négatif (charges) puis positif (production) ---
+    for group, df, default_color in (("charge", all_neg, "lightgrey"), ("prod", all_prod, "grey")):
+        # Scattergl ne gère pas stackgroup : empilement calculé ici, valeur réelle au survol
+        stacked = df.cumsum(axis=1)
+        for i, col in enumerate(df.columns):
+            style = dict(name=col, mode="lines", line=dict(width=0.5, color=COLOR_MAP.get(col, default_color)))
+            if webgl:
+                fig.add_trace(Trace(x=df.index, y=stacked[col], fill="tozeroy" if i == 0 else "tonexty",
+                                    fillcolor=COLOR_MAP.get(col, default_color), customdata=df[col],
+                                    hovertemplate="%{customdata:.0f}", **style))
+            else:
+                fig.add_trace(Trace(x=df.index, y=df[col], stackgroup=group, hoverinfo="x+y+name", **style))
+
+    fig.add_trace(Trace(
+        x=demand.index,
+        y=demand,
+        name="Demande",
+        mode="lines",
+        line=dict(color="black", width=1)
+    ))
+
+    fig.update_layout(
+        title="Production et charge horaire par source d'énergie",
+        xaxis_title="Temps",
+        yaxis_title="Puissance (MW)",
+        hovermode="x unified",
+        template="simple_white",
+        legend=dict(orientation="h", y=-0.2)
+    )
+
+    return fig
+
+
+
+def plot_energybalance(network, results=None):
+    results = compute_results(network) if results is None else results
+    balance = results.energy_balance
+    colors= plt.cm.tab20.colors[:len(balance)]
+    fig, ax = plt.subplots()
+    balance.to_frame().T.plot.bar(stacked=True,
+                                  ax=ax,
+                                  title="Energy Balance",
+                                  color=colors)
+
+    ax.legend(bbox_to_anchor=(1, 0), loc="lower left", title=None, ncol=1)
+
+
+def plot_scenarios(annee):
+    eraa_capa = get_capacities(annee)
+    eraa_gen = eraa_capa[eraa_capa["energy_capacity (MWh)"].isnull()]
+    eraa_gen = eraa_gen[eraa_gen["power_capacity (MW)"] > 0]
+    plt.bar(eraa_gen['name'], eraa_gen['power_capacity (MW)'])
+    plt.title('Energy Balance')
+    plt.ylabel('Power Capacity (MW)')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_evolstorage_plotly(network, results=None):
+    results = compute_results(network) if results is None else results
+
+    SOC = results.state_of_charge_pct
+    # Figure Plotly
+    fig = go.Figure()
+
+    # horizons longs : LTTB par série, qui garde les pleines charges et décharges
+    Trace = go.Scattergl if use_webgl(min(len(SOC), MAX_POINTS)) else go.Scatter
+    for col in SOC.columns:
+        serie = decimate(SOC[col])
+        fig.add_trace(Trace(
+            x=serie.index,
+            y=serie.values,
+            mode="lines",
+            name=col
+        ))
+
+    fig.update_layout(
+        title="Évolution du taux de charge des stockages",
+        xaxis_title="Temps",
+        yaxis_title="taux de charge",
+        template="simple_white",
+        hovermode="x unified",
+        legend=dict(orientation="h", y=-0.2),
+        height=500,
+        width=1200
+    )
+
+    return fig
+def plot_comparatifco2energy(network, results=None):
+    results = compute_results(network) if results is None else results
+    energy, emissions = results.generation_energy, results.generation_emissions
+    comparatif = pd.DataFrame({
+    "emissions": emissions/emissions.sum(),
+    'production': energy/energy.sum()
+    })
+    comparatif_plot = comparatif.reset_index().rename(columns={"index": "energie"})
+
+    fig = px.bar(
+        comparatif_plot,
+        x="Generator",
+        y=["emissions", "production"],
+        barmode="group",
+        title="Ration des émissions CO₂ et production par source d'énergie",
+        labels={
+            "value": "Valeur",
+            "variable": "Indicateur",
+            "energie": "Source d'énergie"},
+    color_discrete_map={
+        "emissions": "crimson",    # couleur du groupe emissions
+        "production": "steelblue"  # couleur du groupe production
+    })
+    
+    return fig
+
+# Attention, pas de temps de 1h pour que les calculs soient valides
+#Calcul : émission co2 en tonnes/MWh * MWh produits par heure
+# on fait la somme de tout ça
+def plot_co2overtime_plotly(network, results=None):
+    results = compute_results(network) if results is None else results
+
+    # Émissions horaires (t) et production (MW) lues dans les résultats (cf. kpi.py)
+    emissions = results.emissions
+    # au-delà d'un mois, barres journalières puis hebdomadaires (intensité moyenne de la période)
+    rule = period_rule(len(emissions))
+    if rule is None:
+        co2_overtime = results.co2_intensity
+    else:
+        co2_overtime = resample_sum(emissions, rule)/resample_sum(results.production.sum(axis=1), rule)*1000
+
+    # Construction du bar chart Plotly
+    fig = go.Figure()
+
+    fig.add_trace(go.Bar(
+        x=co2_overtime.index,
+        y=co2_overtime.values,
+        name="Émissions CO₂"
+    ))
+
+    fig.update_layout(
+        title="Emissions de C02 (gCo2 Eq./kWh)",
+        xaxis_title="Temps",
+        yaxis_title="gCo2 Eq./kWh",
+        template="simple_white",
+        hovermode="x unified",
+        height=500,
+        width=1200
+    )
+
+    return fig, results.co2_total
+
+def plot_marginal_prices(network, results=None):
+    prices = network.buses_t.marginal_price if results is None else results.prices
+    fig, ax = plt.subplots(figsize=(30,10), facecolor="#F0F0F0") 
+    # min et max par intervalle : aucun pic de prix n'est perdu
+    for col in prices.columns:
+        idx = minmax_indices(prices[col].values, MAX_POINTS//2)
+        ax.plot(prices.index[idx], prices[col].values[idx])
+    ax.set_xlabel("Temps")
+    ax.set_ylabel("Prix (€/MWh)")
+    ax.set_title("Prix marginal de l'électricité")
+    ax.grid(which="major", color="grey", linestyle="--", linewidth=1)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Cache disque des simulations résolues.
+
+La clé est une empreinte SHA-256 des paramètres de prep_network, des options
+du solveur et du contenu des fichiers de données utilisés : un CSV ERAA mis à
+jour invalide donc automatiquement les résultats correspondants. Le réseau
+résolu (séries temporelles, duales, objectif) est conservé tel quel et
+rechargé en quelques millisecondes. Les entrées les moins récemment utilisées
+sont supprimées au-delà d'une taille totale (BESS_RESULT_CACHE_MB).
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import numpy as np
+from carriers import CARRIERS_FILE
+from timeseries_store import SOURCES
+
+CACHE_DIR = "./data/result_cache"
+DEFAULT_MAX_BYTES = int(float(os.environ.get("BESS_RESULT_CACHE_MB", 512)) * 1024**2)
+# à incrémenter quand la construction du réseau change de façon incompatible
+CACHE_VERSION = 1
+
+_checksums = {}
+
+
+def file_checksum(path):
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _checksums:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        _checksums[memo_key] = h.hexdigest()
+    return _checksums[memo_key]
+
+
+def data_files(params):
+    # les paramètres des filières entrent dans tous les réseaux
+    files = [CARRIERS_FILE]
+    if "capa_data_year" in params:
+        files.append("./data/ERAA_National_Estimates_capacities_"+str(params["capa_data_year"])+"_france.csv")
+    if "climatic_data_year" in params:
+        files.extend(path.format(year=params["climatic_data_year"]) for path in SOURCES.values())
+    return files
+
+
+def _canonical(value):
+    # 470, 470.0 et np.int64(470) doivent donner la même empreinte
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return repr(float(value))
+    return str(value)
+
+
+def result_key(params, solver_name="cbc", solver_options=None, **options):
+    payload = {
+        "version": CACHE_VERSION,
+        "params": params,
+        "solver": solver_name,
+        "solver_options": solver_options or {},
+        "options": options,
+        "data": {path: file_checksum(path) for path in data_files(params)},
+    }
+    blob = json.dumps(_canonical(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        os.utime(path)  # pour l'éviction LRU
+        self.hits += 1
+        return entry
+
+    def put(self, key, network, status="ok", condition="optimal", **meta):
+        os.makedirs(self.directory, exist_ok=True)
+        entry = dict(network=network, status=status, condition=condition, created=time.time(), **meta)
+        # le modèle linopy n'est pas utile pour l'affichage et pèse lourd
+        model = getattr(network, "_model", None)
+        network._model = None
+        try:
+            path = self._path(key)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        finally:
+            network._model = model
+        self._evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def nbytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            # on garde toujours au moins la dernière entrée écrite
+            for _, size, name in entries[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        for _, _, name in self._entries():
+            os.remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        entries = self._entries()
+        return {"entries": len(entries), "nbytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+CACHE = ResultCache()
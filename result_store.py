@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Stockage en colonnes des simulations résolues.
+
+Chaque run enregistre ses paramètres d'entrée, ses indicateurs (KPI) et ses
+séries temporelles complètes dans deux jeux de données Parquet :
+- runs/ : une ligne par run, partitionné par année de capacité,
+- timeseries/ : format long (run_id, snapshot, name, value), partitionné par
+  série (generation, storage_dispatch, state_of_charge, marginal_price).
+
+Les écritures sont en ajout seul : chaque lot crée de nouveaux fichiers et
+n'en réécrit aucun, ce qui permet à plusieurs processus d'écrire en même
+temps. Les lectures passent par pyarrow.dataset : les filtres (année, source,
+run_id...) sont appliqués aux partitions et aux statistiques des fichiers
+sans tout charger.
+
+Exemple :
+    store = ResultStore()
+    runs = store.runs(where(capa_data_year=2030, status="ok"))
+    prix = store.timeseries(runs["run_id"][:10], "marginal_price")
+"""
+import os
+import threading
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+STORE_DIR = "./data/results"
+
+SERIES = {
+    "generation": lambda n: n.generators_t.p,
+    "storage_dispatch": lambda n: n.storage_units_t.p,
+    "state_of_charge": lambda n: n.storage_units_t.state_of_charge,
+    "marginal_price": lambda n: n.buses_t.marginal_price,
+}
+
+TIMESERIES_SCHEMA = pa.schema([("run_id", pa.string()), ("snapshot", pa.timestamp("ns")),
+                               ("name", pa.string()), ("value", pa.float64())])
+
+# lignes par groupe : assez petits pour que le filtre sur run_id en saute la plupart
+ROWS_PER_GROUP = 65536
+
+
+def where(**equals):
+    # filtre d'égalité simple ; une liste donne un "isin"
+    expression = None
+    for column, value in equals.items():
+        if isinstance(value, (list, tuple, set, pd.Index, pd.Series, np.ndarray)):
+            term = ds.field(column).isin(list(value))
+        else:
+            term = ds.field(column) == value
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def network_timeseries(network):
+    # séries temporelles du réseau résolu, au format long
+    frames = {}
+    for series, getter in SERIES.items():
+        df = getter(network)
+        if df.empty:
+            continue
+        long = df.rename_axis(index="snapshot", columns="name").stack().rename("value").reset_index()
+        frames[series] = long
+    return frames
+
+
+def _scalar(value):
+    # types homogènes d'un lot à l'autre : tous les nombres en float64
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    return value
+
+
+class ResultWriter:
+    # tampon d'écriture : un fichier par lot plutôt qu'un par run
+
+    def __init__(self, store, batch_size=100):
+        self.store = store
+        self.batch_size = batch_size
+        self._runs = []
+        self._timeseries = {}
+        self._lock = threading.Lock()
+
+    def add(self, params, kpis=None, timeseries=None, **meta):
+        run_id = meta.pop("run_id", None) or uuid.uuid4().hex
+        row = {"run_id": run_id, "created": pd.Timestamp.now()}
+        row.update({k: _scalar(v) for k, v in params.items()})
+        row.update({k: _scalar(v) for k, v in (meta or {}).items()})
+        row.update({k: _scalar(v) for k, v in (kpis or {}).items()})
+        with self._lock:
+            self._runs.append(row)
+            for series, frame in (timeseries or {}).items():
+                self._timeseries.setdefault(series, []).append(frame.assign(run_id=run_id))
+            full = len(self._runs) >= self.batch_size
+        if full:
+            self.flush()
+        return run_id
+
+    def add_row(self, params, row, **meta):
+        # ligne d'un runner (sweep, monte_carlo) : tout ce qui n'est pas un paramètre
+        # est stocké tel quel, les séries éventuelles sous la clé "timeseries"
+        row = dict(row)
+        timeseries = row.pop("timeseries", None)
+        return self.add(params, {k: v for k, v in row.items() if k not in params}, timeseries, **meta)
+
+    def flush(self):
+        with self._lock:
+            runs, timeseries = self._runs, self._timeseries
+            self._runs, self._timeseries = [], {}
+        if runs:
+            self.store._write(pd.DataFrame(runs), timeseries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+class ResultStore:
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.runs_dir = os.path.join(directory, "runs")
+        self.timeseries_dir = os.path.join(directory, "timeseries")
+        # schéma unifié par jeu de données, complété avec les seuls nouveaux fichiers
+        self._schemas = {}
+
+    def writer(self, batch_size=100):
+        return ResultWriter(self, batch_size)
+
+    def append(self, params, network=None, kpis=None, **meta):
+        # un run isolé (application) : un lot d'une ligne
+        with self.writer(batch_size=1) as writer:
+            return writer.add(params, kpis, network_timeseries(network) if network is not None else None, **meta)
+
+    def _write(self, runs, timeseries):
+        batch = uuid.uuid4().hex
+        basename = "part-" + batch + "-{i}.parquet"
+        for series, frames in timeseries.items():
+            frame = pd.concat(frames, ignore_index=True).sort_values("run_id", kind="stable")
+            table = pa.Table.from_pandas(frame[TIMESERIES_SCHEMA.names], schema=TIMESERIES_SCHEMA,
+                                         preserve_index=False)
+            ds.write_dataset(table, os.path.join(self.timeseries_dir, "series=" + series), format="parquet",
+                             basename_template=basename, existing_data_behavior="overwrite_or_ignore",
+                             max_rows_per_group=ROWS_PER_GROUP)
+        # la ligne du run est écrite en dernier : un run visible a ses séries
+        ds.write_dataset(pa.Table.from_pandas(runs, preserve_index=False), self.runs_dir, format="parquet",
+                         partitioning=["capa_data_year"], partitioning_flavor="hive", basename_template=basename,
+                         existing_data_behavior="overwrite_or_ignore")
+
+    def _dataset(self, path):
+        if not os.path.isdir(path):
+            return None
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        if not dataset.files:
+            return None
+        # les KPI peuvent varier d'un lot à l'autre : schéma unifié sur tous les fichiers
+        known, schema = self._schemas.get(path, (set(), dataset.schema))
+        new = [fragment.physical_schema for fragment in dataset.get_fragments() if fragment.path not in known]
+        if new:
+            schema = pa.unify_schemas([schema] + new)
+            self._schemas[path] = (set(dataset.files), schema)
+        return ds.dataset(path, schema=schema, format="parquet", partitioning="hive")
+
+    def runs(self, filter=None, columns=None):
+        dataset = self._dataset(self.runs_dir)
+        if dataset is None:
+            return pd.DataFrame(columns=columns or ["run_id"])
+        runs = dataset.to_table(filter=filter, columns=columns).to_pandas()
+        return runs.sort_values("created", ignore_index=True) if "created" in runs else runs
+
+    def timeseries(self, run_ids, series, names=None, columns=None):
+        dataset = self._dataset(os.path.join(self.timeseries_dir, "series=" + series))
+        if dataset is None:
+            return pd.DataFrame(columns=columns or TIMESERIES_SCHEMA.names)
+        filter = ds.field("run_id").isin(list(run_ids))
+        if names is not None:
+            filter = filter & ds.field("name").isin(list(names))
+        return dataset.to_table(filter=filter, columns=columns).to_pandas()
+
+    def timeseries_batches(self, run_ids, series, batch_size=ROWS_PER_GROUP):
+        # même lecture que timeseries, lot par lot : la série n'est jamais chargée en entier
+        dataset = self._dataset(os.path.join(self.timeseries_dir, "series=" + series))
+        if dataset is None:
+            return iter(())
+        return dataset.to_batches(filter=ds.field("run_id").isin(list(run_ids)), batch_size=batch_size)
+
+    def count(self, filter=None):
+        dataset = self._dataset(self.runs_dir)
+        return 0 if dataset is None else dataset.count_rows(filter=filter)
+
+
+STORE = ResultStore()
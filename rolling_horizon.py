@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Optimisation en horizon glissant pour les simulations longues.
+
+Au lieu d'un seul MILP sur toute la période, on résout des fenêtres
+successives (par ex. 7 jours + 1 jour d'anticipation). L'état de charge des
+stockages est reporté d'une fenêtre à la suivante ; l'état de marche des
+unités pilotables et les rampes sont repris par pypsa à partir des résultats
+déjà calculés (generators_t.status / generators_t.p). Les résultats de chaque
+fenêtre sont écrits dans les séries temporelles du réseau : la partie
+d'anticipation est écrasée par la fenêtre suivante, ce qui donne un résultat
+continu sur toute la période.
+"""
+import time
+from instrumentation import record_model, record_result, span
+from main import prep_network
+from solve import check_solution
+
+
+def optimize_rolling_horizon(network, horizon=168, overlap=24, solver_name="cbc", callback=None, **kwargs):
+    # callback(fenêtres résolues, nombre total de fenêtres) après chaque fenêtre
+    if horizon <= overlap:
+        raise ValueError("overlap doit être plus petit que horizon")
+
+    snapshots = network.snapshots
+    soc_initial = network.storage_units.state_of_charge_initial.copy()
+    step = horizon - overlap
+    n_windows = max(1, -(-(len(snapshots) - overlap) // step))
+    windows = []
+    try:
+        for start in range(0, len(snapshots), step):
+            end = min(len(snapshots), start + horizon)
+            sns = snapshots[start:end]
+            if start:
+                network.storage_units.state_of_charge_initial = \
+                    network.storage_units_t.state_of_charge.loc[snapshots[start - 1]]
+
+            t0 = time.perf_counter()
+            with span("model_build+solve", solver=solver_name, window=len(windows) + 1) as attrs:
+                status, condition = check_solution(network, *network.optimize(sns, solver_name=solver_name,
+                                                                              **kwargs))
+                attrs["status"] = status
+            if not windows:
+                # taille du modèle d'une fenêtre (les suivantes sont identiques)
+                record_model(network.model)
+            windows.append(dict(start=sns[0], end=sns[-1], status=status, condition=condition,
+                                objective=network.objective if status == "ok" else None,
+                                solve_time_s=round(time.perf_counter() - t0, 3)))
+            print(f"Fenêtre {len(windows)} [{sns[0]} -> {sns[-1]}] : {status} ({condition})")
+            if callback is not None:
+                callback(len(windows), n_windows)
+            if status != "ok" or end == len(snapshots):
+                break
+    finally:
+        network.storage_units.state_of_charge_initial = soc_initial
+
+    # statut le plus défavorable : une fenêtre en échec (la dernière résolue), sinon une fenêtre
+    # dont l'optimalité n'est pas prouvée (limite de temps, écart MIP)
+    worst = next((w for w in windows if w["status"] != "ok"), None) \
+        or next((w for w in windows if w["condition"] != "optimal"), windows[-1])
+    status, condition = worst["status"], worst["condition"]
+    if status == "ok":
+        # coût sur la période complète, sans double compte des recouvrements ;
+        # objectif posé comme le fait solve_model (le setter public est déprécié)
+        network._objective = float(network.statistics.opex().sum())
+        network._objective_constant = 0.0
+    network.rolling_windows = windows
+    record_result(status, condition)
+    return status, condition
+
+
+def simulate_rolling_horizon(time_horizon_in_hours, date_debut, demand_multiplier, climatic_data_year, clim_year,
+                             capa_data_year, p_bat, capa_bat, p_hyd, capa_hyd, charge_initiale_stockage,
+                             horizon=168, overlap=24, solver_name="cbc", **kwargs):
+    # les temps minimaux d'arrêt relatifs à la durée simulée sont calculés sur la fenêtre
+    network = prep_network(time_horizon_in_hours, date_debut, demand_multiplier, climatic_data_year, clim_year,
+                           capa_data_year, p_bat, capa_bat, p_hyd, capa_hyd, charge_initiale_stockage,
+                           commitment_window=horizon)
+    result = optimize_rolling_horizon(network, horizon=horizon, overlap=overlap, solver_name=solver_name, **kwargs)
+    return network, result
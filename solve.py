@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Modes de résolution du réseau.
+
+- "exact" : MILP complet avec engagement des unités (committable=True),
+- "fast" : relaxation linéaire de l'engagement (formulation linéarisée de
+  pypsa, qui agrège la décision d'engagement par unité), pour les essais
+  interactifs.
+
+compare_modes résout les deux modes sur les mêmes entrées et donne le gain
+de temps et les écarts de CO2, de prix marginaux et de pilotage du stockage.
+
+SolverConfig choisit le solveur parmi ceux installés et traduit les options
+communes (threads, limite de temps, écart MIP relatif) dans le vocabulaire de
+chaque solveur. Sur limite de temps, la meilleure solution trouvée est
+conservée ; le statut n'est "ok" que si une solution réalisable existe.
+
+mip_start_kwargs fournit au solveur les résultats d'un réseau déjà résolu
+(engagement, production, stockage) comme solution de départ du MILP suivant,
+quand celui-ci est voisin (même structure, autres bornes) ; warm_started
+l'ajoute aux arguments de l'appelant le temps d'une résolution.
+
+Exemple :
+    python solve.py --horizon 168 --date-debut 2880 --solver highs
+    python solve.py --horizon 744 --date-debut 2880 --solver highs --warm-start 570 670 800
+"""
+import argparse
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+import pandas as pd
+from instrumentation import record_model, record_result, span
+from kpi import compute_kpis
+from main import prep_network
+
+SOLVE_MODES = {
+    "exact": {},
+    "fast": {"linearized_unit_commitment": True},
+}
+
+# ordre de préférence quand plusieurs solveurs sont installés
+SOLVER_PREFERENCE = ["gurobi", "highs", "cbc", "glpk"]
+
+# option commune -> nom de l'option pour chaque solveur (absente = non supportée)
+SOLVER_OPTION_NAMES = {
+    "cbc": {"threads": "threads", "time_limit": "sec", "mip_rel_gap": "ratioGap"},
+    "highs": {"threads": "threads", "time_limit": "time_limit", "mip_rel_gap": "mip_rel_gap"},
+    "gurobi": {"threads": "Threads", "time_limit": "TimeLimit", "mip_rel_gap": "MIPGap"},
+    "glpk": {"time_limit": "tmlim", "mip_rel_gap": "mipgap"},
+}
+
+
+def available_solvers():
+    # linopy n'est chargé qu'ici (plus d'une seconde), pas à l'import du module
+    import linopy
+    return [name for name in SOLVER_PREFERENCE if name in linopy.available_solvers]
+
+
+def default_solver():
+    solvers = available_solvers()
+    if not solvers:
+        raise RuntimeError("Aucun solveur installé parmi " + ", ".join(SOLVER_PREFERENCE))
+    return solvers[0]
+
+
+@dataclass
+class SolverConfig:
+    name: str = "cbc"
+    threads: Optional[int] = None
+    time_limit: Optional[float] = None
+    mip_rel_gap: Optional[float] = None
+
+    def options(self):
+        names = SOLVER_OPTION_NAMES.get(self.name, {})
+        values = {"threads": self.threads, "time_limit": self.time_limit, "mip_rel_gap": self.mip_rel_gap}
+        # glpk n'a pas d'option de threads et n'accepte qu'une limite entière
+        if self.name == "glpk" and self.time_limit is not None:
+            values["time_limit"] = max(1, int(self.time_limit))
+        return {names[k]: v for k, v in values.items() if v is not None and k in names}
+
+    def solve_kwargs(self):
+        return {"solver_name": self.name, "solver_options": self.options()}
+
+
+def check_solution(network, status, condition):
+    # pypsa renvoie "ok" sur limite de temps même si aucune solution réalisable
+    # n'a été trouvée (objectif infini, productions nulles)
+    if status == "ok" and not np.isfinite(network.model.objective.value):
+        return "warning", condition
+    return status, condition
+
+
+def is_incumbent(status, condition):
+    # solution réalisable mais optimalité non prouvée (limite de temps, écart MIP)
+    return status == "ok" and condition != "optimal"
+
+
+def mip_gap(network):
+    # écart relatif final, quand le solveur l'expose après la résolution
+    solver_model = getattr(network.model, "solver_model", None)
+    try:
+        if network.model.solver_name == "highs":
+            gap = float(solver_model.getInfo().mip_gap)
+        elif network.model.solver_name == "gurobi":
+            gap = float(solver_model.MIPGap)
+        else:
+            return None
+    except Exception:
+        return None
+    return gap if np.isfinite(gap) else None
+
+
+def start_values(network, model):
+    # inverse de pypsa assign_solution : résultats du réseau -> étiquettes du modèle.
+    # Les variables sans résultat reprennent la dernière solution du modèle, sinon 0
+    labels, values = [], []
+    for name, var in model.variables.items():
+        frame = var.labels.to_pandas()
+        known = None
+        if "-" in name and isinstance(frame, pd.DataFrame) and var.labels.dims[0] == "snapshot":
+            component, attr = name.split("-", 1)
+            result = network.dynamic(component).get(attr)
+            if result is not None and not result.empty:
+                known = result.reindex(index=frame.index, columns=frame.columns).values
+        # variables sans dimension (ex. objective_constant) : tableau à 0 dimension
+        frame_labels = np.atleast_1d(np.asarray(frame))
+        fallback = var.solution.values if var.solution.size else np.zeros(frame_labels.shape)
+        vals = fallback if known is None else np.where(np.isnan(known), fallback, known)
+        mask = frame_labels != -1
+        labels.append(frame_labels[mask])
+        values.append(np.nan_to_num(np.atleast_1d(np.asarray(vals, dtype=float))[mask]))
+    labels, values = np.concatenate(labels), np.concatenate(values)
+    order = np.argsort(labels)
+    return labels[order], values[order]
+
+
+def _write_start(path, solver_name, labels, values):
+    # les colonnes du modèle s'appellent x<étiquette> (écriture linopy par défaut)
+    with open(path, "w") as f:
+        if solver_name == "highs":
+            f.write(f"Model status\nUnknown\n\n# Primal solution values\nFeasible\nObjective 0\n"
+                    f"# Columns {len(labels)}\n")
+            f.writelines(f"x{l} {v:.12g}\n" for l, v in zip(labels, values))
+        elif solver_name == "cbc":
+            f.writelines(f"{i} x{l} {v:.12g}\n" for i, (l, v) in enumerate(zip(labels, values)))
+        else:
+            f.writelines(f"x{l} {v:.12g}\n" for l, v in zip(labels, values))
+
+
+# format et mode de passage de la solution de départ selon le solveur ;
+# glpk ne lit qu'une base LP et n'est pas démarré à chaud
+MIP_START_SOLVERS = {"highs": ".sol", "gurobi": ".sol", "cbc": ".mst"}
+
+
+def mip_start_kwargs(network, model, solver_name, path=None):
+    # renvoie les arguments à passer à solve_model (vide si non supporté)
+    if solver_name not in MIP_START_SOLVERS:
+        return {}
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="bess-start-", suffix=MIP_START_SOLVERS[solver_name])
+        os.close(fd)
+        try:
+            _write_start(path, solver_name, *start_values(network, model))
+        except Exception:
+            os.remove(path)
+            raise
+    else:
+        _write_start(path, solver_name, *start_values(network, model))
+    if solver_name == "cbc":
+        return {"solver_options": {"mipstart": path}}
+    return {"warmstart_fn": path}
+
+
+@contextmanager
+def warm_started(network, model, solver_name, enabled=True, **kwargs):
+    # arguments de solve_model : ceux de l'appelant, complétés par la solution de départ
+    # (fusionnée aux solver_options pour cbc) ; seul le fichier de départ est supprimé à la sortie
+    start = mip_start_kwargs(network, model, solver_name) if enabled else {}
+    path = start.get("warmstart_fn") or start.get("solver_options", {}).get("mipstart")
+    if "solver_options" in start:
+        start["solver_options"] = {**(kwargs.pop("solver_options", None) or {}), **start["solver_options"]}
+    try:
+        yield dict(kwargs, **start), path is not None
+    finally:
+        if path is not None:
+            os.remove(path)
+
+
+def solve_network(network, mode="exact", solver_name="cbc", **kwargs):
+    if mode not in SOLVE_MODES:
+        raise ValueError("Mode de résolution inconnu : " + str(mode))
+    # network.optimize construit et résout le modèle : un seul span
+    with span("model_build+solve", solver=solver_name, mode=mode) as attrs:
+        status, condition = check_solution(network, *network.optimize(solver_name=solver_name,
+                                                                      **SOLVE_MODES[mode], **kwargs))
+        attrs["status"] = status
+    record_model(network.model)
+    record_result(status, condition, mip_gap=mip_gap(network))
+    return status, condition
+
+
+def commitment_fixed_prices(network, solver_name="cbc", **kwargs):
+    # Le MILP n'a pas de duales : on reprend la formulation linéarisée en fixant
+    # l'engagement trouvé par le MILP, et on lit les prix marginaux du LP obtenu
+    import xarray as xr
+    status = network.generators_t.status
+
+    def fix_commitment(n, sns):
+        var = n.model["Generator-status"]
+        com = var.indexes["Generator-com"]
+        values = status.reindex(index=sns, columns=com).fillna(0).values
+        n.model.add_constraints(var == xr.DataArray(values, coords=[sns, com]), name="Generator-status-fixed")
+
+    # pypsa refuse de copier un réseau auquel le modèle résolu est attaché
+    model = network._model
+    network._model = None
+    try:
+        fixed = network.copy()
+    finally:
+        network._model = model
+    fixed.optimize(solver_name=solver_name, linearized_unit_commitment=True, extra_functionality=fix_commitment,
+                   **kwargs)
+    return fixed.buses_t.marginal_price
+
+
+def compare_modes(params, solver_name="cbc", **kwargs):
+    networks, times = {}, {}
+    for mode in SOLVE_MODES:
+        t0 = time.perf_counter()
+        network = prep_network(**params)
+        status, condition = solve_network(network, mode, solver_name, **kwargs)
+        times[mode] = time.perf_counter() - t0
+        if status != "ok":
+            return {"mode": mode, "status": status, "condition": condition}
+        networks[mode] = network
+
+    exact, fast = networks["exact"], networks["fast"]
+    kpis_exact, kpis_fast = compute_kpis(exact), compute_kpis(fast)
+    prices_exact = commitment_fixed_prices(exact, solver_name, **kwargs)
+    price_gap = (fast.buses_t.marginal_price - prices_exact).abs()
+    storage_gap = (fast.storage_units_t.p - exact.storage_units_t.p).abs()
+
+    return {
+        "exact_time_s": times["exact"],
+        "fast_time_s": times["fast"],
+        "speedup": times["exact"]/times["fast"],
+        "exact_co2": kpis_exact["co2_total"],
+        "fast_co2": kpis_fast["co2_total"],
+        "co2_deviation": (kpis_fast["co2_total"] - kpis_exact["co2_total"])/kpis_exact["co2_total"],
+        "cost_deviation": (kpis_fast["system_cost"] - kpis_exact["system_cost"])/kpis_exact["system_cost"],
+        "price_mae": float(price_gap.mean().mean()),
+        "price_max_abs": float(price_gap.max().max()),
+        "storage_dispatch_mae": float(storage_gap.mean().mean()),
+        # écart moyen rapporté à la puissance de chaque stockage
+        "storage_dispatch_mae_pu": float((storage_gap.mean()/exact.storage_units.p_nom).mean()),
+    }
+
+
+def warm_start_report(params, steps, solver_name="cbc", **kwargs):
+    # chaque pas est résolu à chaud depuis le pas précédent, puis à froid : gain mesuré
+    from network_template import NetworkTemplate
+
+    template = NetworkTemplate(**params)
+    template.optimize(solver_name, **kwargs)
+    rows = []
+    for step in steps:
+        template.update(**step)
+        t0 = time.perf_counter()
+        warm = template.optimize(solver_name, warm_start=True, **kwargs)
+        warm_s, warm_objective = time.perf_counter() - t0, template.network.objective
+        t0 = time.perf_counter()
+        cold = template.optimize(solver_name, **kwargs)
+        cold_s = time.perf_counter() - t0
+        rows.append(dict(step, warm_status=warm[0], cold_status=cold[0], warm_s=warm_s, cold_s=cold_s,
+                         saved_s=cold_s - warm_s, objective_gap=warm_objective - template.network.objective))
+    return pd.DataFrame(rows)
+
+
+def main():
+    from sweep import DEFAULTS
+
+    parser = argparse.ArgumentParser(description="Comparaison MILP / relaxation linéaire")
+    parser.add_argument("--horizon", type=int, default=DEFAULTS["time_horizon_in_hours"])
+    parser.add_argument("--date-debut", type=int, default=DEFAULTS["date_debut"])
+    parser.add_argument("--capa-year", type=int, default=DEFAULTS["capa_data_year"])
+    parser.add_argument("--solver", default="cbc")
+    parser.add_argument("--warm-start", type=float, nargs="+", default=None, metavar="P_BAT",
+                        help="mesure le démarrage à chaud sur ces puissances batteries successives")
+    args = parser.parse_args()
+
+    params = dict(DEFAULTS, time_horizon_in_hours=args.horizon, date_debut=args.date_debut,
+                  capa_data_year=args.capa_year)
+    if args.warm_start:
+        report = warm_start_report(params, [{"p_bat": p} for p in args.warm_start], solver_name=args.solver)
+        print(report.to_string(index=False))
+        print(f"Gain total : {report['saved_s'].sum():.2f} s sur {report['cold_s'].sum():.2f} s à froid")
+        return
+    report = compare_modes(params, solver_name=args.solver)
+    print(pd.Series(report).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Balayage parallèle des tailles de stockage.
+
+Chaque combinaison (p_bat, capa_bat, p_hyd, capa_hyd) est résolue dans un
+pool de processus ; les indicateurs de chaque run sont écrits dans un CSV au
+fil de l'eau. Chaque worker garde un NetworkTemplate (réseau chargé sur
+toute l'année, cf. windowed_network.py) et ne reconstruit donc pas le réseau
+d'un run à l'autre, même quand la fenêtre simulée change.
+
+Exemple :
+    python sweep.py --p-bat 500 1000 2000 --capa-bat 1000 4000 --workers 16 --threads 1
+    python sweep.py --lhs 200 --p-bat 100 2000 --capa-bat 200 20000 --p-hyd 500 4000 --capa-hyd 5000 200000
+"""
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+import numpy as np
+from kpi import compute_kpis
+from network_template import NetworkTemplate, STORAGE_PARAMS
+from result_store import STORE, network_timeseries
+from solve import SolverConfig
+from timeseries_store import ensure_ingested
+
+SWEEP_PARAMS = ("p_bat", "capa_bat", "p_hyd", "capa_hyd")
+
+DEFAULTS = dict(time_horizon_in_hours=168, date_debut=0, demand_multiplier=1.0, climatic_data_year=2025,
+                clim_year=2012, capa_data_year=2025, p_bat=470, capa_bat=940, p_hyd=3800, capa_hyd=100000,
+                charge_initiale_stockage=0.8)
+
+FIELDS = (list(SWEEP_PARAMS) + ["status", "condition", "co2_total", "system_cost", "co2_intensity", "curtailment"]
+          + ["cycles_" + name for name in STORAGE_PARAMS] + ["wall_time_s", "warm_start_saved_s_estimate"])
+
+
+def parameter_grid(**values):
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(values[n] for n in names))]
+
+
+def latin_hypercube(n_samples, seed=None, **bounds):
+    from scipy.stats import qmc
+    names = list(bounds)
+    sample = qmc.LatinHypercube(d=len(names), seed=seed).random(n_samples)
+    low = np.array([bounds[n][0] for n in names], dtype=float)
+    high = np.array([bounds[n][1] for n in names], dtype=float)
+    scaled = low + sample*(high - low)
+    return [dict(zip(names, row)) for row in scaled.round(1).tolist()]
+
+
+_TEMPLATES = {}
+
+
+def run_one(params, solver_name="cbc", threads=1, time_limit=None, mip_rel_gap=None, keep_timeseries=False):
+    start = time.perf_counter()
+    template = _TEMPLATES.get("current")
+    if template is not None and template.matches(**params):
+        template.update(**params)
+    else:
+        template = NetworkTemplate(**params)
+        _TEMPLATES["current"] = template
+
+    config = SolverConfig(solver_name, threads=threads or None, time_limit=time_limit, mip_rel_gap=mip_rel_gap)
+    # le run précédent du worker sert de solution de départ quand le modèle est réutilisé ;
+    # les prix ne sont relus que s'ils sont enregistrés avec les séries
+    outputs = ("dispatch", "prices") if keep_timeseries else ("dispatch",)
+    status, condition = template.optimize(**config.solve_kwargs(), outputs=outputs, warm_start=True)
+
+    row = {p: params[p] for p in SWEEP_PARAMS}
+    row.update(status=status, condition=condition)
+    if template.last_warm_start is not None:
+        row["warm_start_saved_s_estimate"] = round(template.last_warm_start["saved_s_estimate"], 3)
+    if status == "ok":
+        row.update(compute_kpis(template.network))
+        if keep_timeseries:
+            row["timeseries"] = network_timeseries(template.network)
+    row["wall_time_s"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def run_sweep(runs, output, workers=None, threads=1, solver_name="cbc", time_limit=None, mip_rel_gap=None,
+              store=None, **base_params):
+    # store : ResultStore où ajouter chaque run (paramètres, KPI, séries), par lots
+    base = dict(DEFAULTS)
+    base.update(base_params)
+    runs = [dict(base, **run) for run in runs]
+    workers = workers or os.cpu_count()
+    # conversion binaire faite une fois ici plutôt que par chaque worker
+    for data_year in sorted({run["climatic_data_year"] for run in runs}):
+        ensure_ingested(data_year)
+
+    rows = []
+    # threads : limite passée au solveur de chaque worker (SolverConfig), seul calcul parallèle du run
+    with open(output, "w", newline="") as f, \
+            ProcessPoolExecutor(max_workers=workers) as pool, \
+            (store.writer() if store is not None else nullcontext()) as store_writer:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        futures = {pool.submit(run_one, run, solver_name, threads, time_limit, mip_rel_gap, store is not None): run
+                   for run in runs}
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                row = future.result()
+            except Exception as e:
+                run = futures[future]
+                row = {p: run[p] for p in SWEEP_PARAMS}
+                row.update(status="error", condition=str(e), wall_time_s=None)
+            if store_writer is not None:
+                store_writer.add_row(futures[future], row, source="sweep", solver=solver_name)
+                row.pop("timeseries", None)
+            rows.append(row)
+            writer.writerow(row)
+            f.flush()
+            print(f"[{i}/{len(runs)}] {row['status']} en {row['wall_time_s']} s")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Balayage parallèle des tailles de stockage")
+    for name in SWEEP_PARAMS:
+        parser.add_argument("--" + name.replace("_", "-"), type=float, nargs="+", default=[DEFAULTS[name]])
+    parser.add_argument("--lhs", type=int, default=0,
+                        help="nombre de tirages Latin hypercube (les valeurs de chaque paramètre sont lues comme min max)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=1, help="threads par solveur")
+    parser.add_argument("--solver", default="cbc")
+    parser.add_argument("--time-limit", type=float, default=None, help="limite de temps par run (s)")
+    parser.add_argument("--mip-gap", type=float, default=None, help="écart MIP relatif accepté")
+    parser.add_argument("--output", default="sweep_results.csv")
+    parser.add_argument("--store", action="store_true", help="ajoute les runs au stockage Parquet (result_store)")
+    parser.add_argument("--horizon", type=int, default=DEFAULTS["time_horizon_in_hours"])
+    parser.add_argument("--date-debut", type=int, default=DEFAULTS["date_debut"])
+    parser.add_argument("--demand-multiplier", type=float, default=DEFAULTS["demand_multiplier"])
+    parser.add_argument("--capa-year", type=int, default=DEFAULTS["capa_data_year"])
+    parser.add_argument("--climatic-data-year", type=int, default=DEFAULTS["climatic_data_year"])
+    parser.add_argument("--clim-year", type=int, default=DEFAULTS["clim_year"])
+    parser.add_argument("--charge-initiale", type=float, default=DEFAULTS["charge_initiale_stockage"])
+    args = parser.parse_args()
+
+    values = {name: getattr(args, name) for name in SWEEP_PARAMS}
+    if args.lhs:
+        runs = latin_hypercube(args.lhs, seed=args.seed, **{n: (min(v), max(v)) for n, v in values.items()})
+    else:
+        runs = parameter_grid(**values)
+
+    run_sweep(runs, args.output, workers=args.workers, threads=args.threads, solver_name=args.solver,
+              time_limit=args.time_limit, mip_rel_gap=args.mip_gap, store=STORE if args.store else None,
+              time_horizon_in_hours=args.horizon, date_debut=args.date_debut,
+              demand_multiplier=args.demand_multiplier, capa_data_year=args.capa_year,
+              climatic_data_year=args.climatic_data_year, clim_year=args.clim_year,
+              charge_initiale_stockage=args.charge_initiale)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # les modules lisent leurs données en chemins relatifs (./data/...)
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def params():
+    # une journée de printemps : chaque résolution prend quelques secondes
+    from sweep import DEFAULTS
+    return dict(DEFAULTS, time_horizon_in_hours=24, date_debut=2880)
+
+
+@pytest.fixture
+def dispatched(params):
+    # réseau résolu par le LP dédié (sans engagement), le plus rapide à obtenir
+    from fast_dispatch import optimize_dispatch
+    from main import prep_network
+    network = prep_network(**params)
+    assert optimize_dispatch(network) == ("ok", "optimal")
+    return network
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import os
+import zipfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from export import FORMATS, network_batches, read_kpis, spool, stream_network, stream_runs
+from result_store import SERIES, ResultStore
+
+KPIS = {"co2_total": 12.5, "price_mean": 40.0}
+
+
+def _expected(network):
+    return pa.Table.from_batches([batch for _, batch in network_batches(network)]).to_pandas()
+
+
+def _read(path, fmt):
+    if fmt == "parquet":
+        return pq.read_table(path).to_pandas()
+    if fmt == "arrow":
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    with zipfile.ZipFile(path) as archive:
+        frames = [pd.read_csv(archive.open(name + ".csv"), parse_dates=["snapshot"]).assign(series=name)
+                  for name in SERIES if name + ".csv" in archive.namelist()]
+        return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize("fmt", list(FORMATS))
+def test_round_trip(fmt, dispatched):
+    path = spool(stream_network(dispatched, fmt, KPIS, chunk_rows=7), fmt)
+    try:
+        assert path.endswith(FORMATS[fmt])
+        columns = ["series", "snapshot", "name", "value"]
+        expected = _expected(dispatched)[columns]
+        result = _read(path, fmt)[columns]
+        assert len(result) == len(expected) == sum(SERIES[name](dispatched).size for name in SERIES)
+        pd.testing.assert_frame_equal(result.astype(expected.dtypes), expected, check_exact=False, rtol=1e-6)
+        if fmt == "csv":
+            with zipfile.ZipFile(path) as archive:
+                kpis = pd.read_csv(archive.open("kpis.csv"))
+        else:
+            kpis = read_kpis(path)
+        assert kpis.to_dict("records") == [KPIS]
+    finally:
+        os.remove(path)
+
+
+def test_stream_runs_from_store(tmp_path, params, dispatched):
+    store = ResultStore(str(tmp_path / "store"))
+    run_id = store.append(params, dispatched, kpis=KPIS, source="test")
+    path = str(tmp_path / "runs.parquet")
+    with open(path, "wb") as f:
+        for chunk in stream_runs(store.runs(), "parquet", store=store):
+            f.write(chunk)
+    table = pq.read_table(path).to_pandas()
+    assert set(table["run_id"]) == {run_id}
+    assert len(table) == len(_expected(dispatched))
+    assert read_kpis(path).loc[0, "co2_total"] == KPIS["co2_total"]
+
+
+def test_failed_export_leaves_no_file(dispatched, tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    with pytest.raises(ValueError):
+        spool(stream_network(dispatched, "xlsx"), "parquet")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from fast_dispatch import check_objective, optimize_dispatch
+from main import prep_network
+
+
+def test_objective_matches_pypsa(dispatched):
+    report = check_objective(dispatched, "highs")
+    assert report["match"], report
+
+
+def test_solution_is_balanced(dispatched):
+    # production + déstockage = demande à chaque heure
+    supply = dispatched.generators_t.p.sum(axis=1) + dispatched.storage_units_t.p.sum(axis=1)
+    demand = dispatched.loads_t.p_set.sum(axis=1)
+    np.testing.assert_allclose(supply, demand, rtol=1e-6)
+    assert dispatched.buses_t.marginal_price.notna().all().all()
+
+
+def test_extendable_capacity_is_rejected(params):
+    network = prep_network(**params)
+    network.generators["p_nom_extendable"] = True
+    with pytest.raises(ValueError):
+        optimize_dispatch(network)
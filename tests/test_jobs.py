@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import threading
+import pytest
+from jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobManager
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_concurrent=1)
+    yield manager
+    manager.shutdown(wait=True)
+
+
+def _wait(manager, job_id):
+    job = manager.get(job_id)
+    job.future.result(timeout=10)
+    return job
+
+
+def test_done_keeps_result_and_meta(manager):
+    job_id = manager.submit(lambda job, x: x*2, 21, description="test", meta={"cle": "abc"})
+    job = _wait(manager, job_id)
+    assert (job.status, job.result, job.progress) == (DONE, 42, 1.0)
+    assert job.meta == {"cle": "abc"} and job.elapsed() >= 0
+
+
+def test_failed_keeps_error(manager):
+    def fail(job):
+        raise ValueError("infaisable")
+    job = _wait(manager, manager.submit(fail))
+    assert job.status == FAILED and isinstance(job.error, ValueError)
+
+
+def test_cancel_queued_and_running(manager):
+    started, release = threading.Event(), threading.Event()
+
+    def long_solve(job):
+        started.set()
+        while not release.wait(0.01):
+            job.set_progress(0.5, "fenêtre")
+
+    running = manager.submit(long_solve)
+    queued = manager.submit(lambda job: "jamais")
+    assert started.wait(5)
+    assert manager.get(running).status == RUNNING
+    assert manager.get(queued).status == QUEUED
+    # la tâche en attente ne démarre pas, la tâche en cours s'arrête au point de contrôle suivant
+    assert manager.cancel(queued)
+    assert manager.get(queued).status == CANCELLED
+    assert manager.cancel(running)
+    assert _wait(manager, running).status == CANCELLED
+    assert manager.get(queued).result is None
+    assert not manager.cancel(running)
+    assert manager.stats()[CANCELLED] == 2
+
+
+def test_finished_jobs_are_pruned():
+    manager = JobManager(max_concurrent=1, keep_finished=2)
+    try:
+        ids = [manager.submit(lambda job: None) for _ in range(3)]
+        for job_id in ids:
+            _wait(manager, job_id)
+        manager.submit(lambda job: None)
+        assert manager.get(ids[0]) is None
+    finally:
+        manager.shutdown(wait=True)
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from pareto import pareto_front
+
+
+def test_co2_price_lowers_emissions(params):
+    front = pareto_front(params, method="weighted", co2_prices=[0, 500], solver_name="highs", mode="fast")
+    assert list(front["status"]) == ["ok", "ok"]
+    cheap, taxed = front.to_dict("records")
+    # prix du CO₂ : émissions plus basses, au prix d'un coût (hors taxe) plus élevé
+    assert taxed["co2_total"] < cheap["co2_total"]
+    assert taxed["system_cost"] >= cheap["system_cost"]*(1 - 1e-6)
+
+
+def test_epsilon_front_is_monotone(params):
+    front = pareto_front(params, points=3, method="epsilon", solver_name="highs", mode="fast")
+    assert (front["status"] == "ok").all()
+    # plafonds croissants : émissions croissantes, coût décroissant
+    assert front["co2_total"].is_monotonic_increasing
+    assert (front["system_cost"].diff().dropna() <= 1e-6*front["system_cost"].abs().max()).all()
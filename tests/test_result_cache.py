@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pypsa
+import result_cache
+from result_cache import ResultCache, result_key
+
+PARAMS = dict(time_horizon_in_hours=24, date_debut=2880, climatic_data_year=2025, capa_data_year=2025, p_bat=470)
+
+
+def test_key_is_canonical():
+    # même simulation quel que soit le type des nombres ou l'ordre des paramètres
+    key = result_key(PARAMS, "highs")
+    assert result_key(dict(PARAMS, p_bat=470.0), "highs") == key
+    assert result_key(dict(PARAMS, p_bat=np.int64(470)), "highs") == key
+    assert result_key(dict(reversed(list(PARAMS.items()))), "highs") == key
+    assert len(key) == 64
+
+
+def test_key_changes_with_inputs():
+    key = result_key(PARAMS, "highs")
+    assert result_key(dict(PARAMS, p_bat=471), "highs") != key
+    assert result_key(PARAMS, "cbc") != key
+    assert result_key(PARAMS, "highs", {"threads": 2}) != key
+    assert result_key(PARAMS, "highs", mode="fast") != key
+
+
+def test_key_changes_with_data_files(tmp_path, monkeypatch):
+    data = tmp_path / "capacities.csv"
+    data.write_text("carrier,p_nom\nnuclear,61000\n")
+    monkeypatch.setattr(result_cache, "data_files", lambda params: [str(data)])
+    key = result_key(PARAMS, "highs")
+    data.write_text("carrier,p_nom\nnuclear,63000\n")
+    assert result_key(PARAMS, "highs") != key
+
+
+def test_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    network = pypsa.Network()
+    network.add("Bus", "FR")
+    assert cache.get("absent") is None
+    cache.put("cle", network, status="ok", condition="optimal", solver="highs")
+    entry = cache.get("cle")
+    assert entry["status"] == "ok" and entry["solver"] == "highs"
+    assert list(entry["network"].buses.index) == ["FR"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_eviction_keeps_last_entry(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=1)
+    for key in ("a", "b", "c"):
+        cache.put(key, pypsa.Network())
+    assert cache.stats()["entries"] == 1
+    assert cache.get("c") is not None
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import pyarrow.dataset as ds
+from result_store import SERIES, ResultStore, where
+
+
+def test_append_and_read(tmp_path, params, dispatched):
+    store = ResultStore(str(tmp_path))
+    assert store.runs().empty and store.count() == 0
+    run_id = store.append(params, dispatched, kpis={"co2_total": 12.5}, source="test", solver="highs")
+    other = store.append(dict(params, p_bat=600), kpis={"co2_total": 11.0}, source="app")
+
+    runs = store.runs(ds.field("source") == "test")
+    assert list(runs["run_id"]) == [run_id]
+    assert runs.loc[0, "p_bat"] == params["p_bat"] and runs.loc[0, "co2_total"] == 12.5
+    assert runs.loc[0, "solver"] == "highs"
+    assert list(store.runs(where(run_id=[run_id, other]))["run_id"]) == [run_id, other]
+    assert store.count() == 2
+
+    for series in SERIES:
+        ts = store.timeseries([run_id], series)
+        assert len(ts) == SERIES[series](dispatched).size
+    prices = store.timeseries([run_id], "marginal_price", names=["FR"])
+    assert list(prices["value"]) == list(dispatched.buses_t.marginal_price["FR"])
+    # run sans réseau : aucune série
+    assert store.timeseries([other], "generation").empty
+
+
+def test_writer_batches_runs(tmp_path, params):
+    store = ResultStore(str(tmp_path))
+    with store.writer(batch_size=10) as writer:
+        for p_bat in (300, 600, 900):
+            writer.add(dict(params, p_bat=p_bat), {"co2_total": float(p_bat)}, source="sweep")
+        # rien n'est visible avant l'écriture du lot
+        assert store.count() == 0
+    assert list(store.runs(where(source="sweep"))["p_bat"]) == [300, 600, 900]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import pytest
+from main import prep_network
+from solve import SOLVE_MODES, solve_network
+
+
+def test_fast_mode_is_a_relaxation(params):
+    # l'engagement linéarisé relâche le MILP : son coût ne peut pas dépasser l'optimum exact
+    objectives = {}
+    for mode in SOLVE_MODES:
+        network = prep_network(**params)
+        assert solve_network(network, mode, "highs") == ("ok", "optimal")
+        objectives[mode] = network.objective
+    assert objectives["fast"] <= objectives["exact"]*(1 + 1e-6)
+    assert objectives["fast"] == pytest.approx(objectives["exact"], rel=0.1)
+
+
+def test_unknown_mode(params):
+    with pytest.raises(ValueError):
+        solve_network(prep_network(**params), "approx", "highs")
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import numpy as np
+import pytest
+import timeseries_store
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(timeseries_store, "STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _ingest(barrier, results):
+    barrier.wait()
+    try:
+        timeseries_store.ensure_ingested(2025)
+        timeseries_store.load_window("demand", 2025, 2012, 0, 24)
+        results.put("ok")
+    except Exception as e:
+        results.put(repr(e))
+
+
+def test_ingest_round_trip(store_dir):
+    timeseries_store.ingest_year(2025)
+    assert timeseries_store.is_ingested(2025)
+    dates = timeseries_store.load_dates(2025, 2012)
+    demand = timeseries_store.load_window("demand", 2025, 2012)
+    assert len(dates) == len(demand)
+    assert isinstance(demand, np.memmap)
+    # aucun répertoire de travail ne reste après l'ingestion
+    assert sorted(os.listdir(store_dir)) == ["2025"]
+
+
+def test_concurrent_ingest(store_dir):
+    # plusieurs workers ingèrent la même année en même temps (premier balayage sur un stock vide)
+    context = multiprocessing.get_context("fork")
+    barrier, results = context.Barrier(4), context.Queue()
+    workers = [context.Process(target=_ingest, args=(barrier, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert sorted(results.get(timeout=5) for _ in workers) == ["ok"]*4
+    assert sorted(os.listdir(store_dir)) == ["2025"]
+
+
+def test_reingest_replaces_stale_year(store_dir):
+    timeseries_store.ingest_year(2025)
+    marker = timeseries_store._marker_path(2025)
+    os.utime(marker, (0, 0))
+    assert not timeseries_store.is_ingested(2025)
+    timeseries_store.ensure_ingested(2025)
+    assert timeseries_store.is_ingested(2025)
+    assert sorted(os.listdir(store_dir)) == ["2025"]
+
+
+def test_profiles_matrix_matches_series(store_dir):
+    profiles = timeseries_store.load_profiles(2025, 2012)
+    assert isinstance(profiles, np.memmap)
+    for row, series in enumerate(timeseries_store.PROFILE_SERIES):
+        np.testing.assert_array_equal(profiles[row], timeseries_store.load_window(series, 2025, 2012))
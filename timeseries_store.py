@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Stockage binaire des séries temporelles (demande et facteurs de charge).
+
+Les CSV ERAA sont convertis une seule fois en tableaux .npy, un fichier par
+année de données x année climatique x série, puis relus en mémoire mappée :
+plusieurs processus partagent ainsi la même copie en cache disque. Les
+facteurs de charge sont aussi rangés ensemble dans profiles.npy (une ligne
+par série de PROFILE_SERIES).
+
+Ingestion manuelle : python timeseries_store.py [années ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+STORE_DIR = "./data/store"
+
+DATA_YEARS = [2025, 2028, 2030, 2033]
+
+SOURCES = {
+    "demand": "./data/Demand_TimeSeries/demand_{year}_france.csv",
+    "wind_onshore": "./data/capa/Wind_Onshore/capa_factor_{year}_france.csv",
+    "wind_offshore": "./data/capa/Wind_Offshore/capa_factor_{year}_france.csv",
+    "solar_pv": "./data/capa/Solar_PV/capa_factor_{year}_france.csv",
+}
+
+# facteurs de charge regroupés en une matrice (série x pas de temps), un seul
+# tableau mappé par année climatique : les lignes sont contiguës en mémoire
+PROFILE_SERIES = ("wind_onshore", "wind_offshore", "solar_pv")
+
+# version du format : un stock d'une version antérieure est reconstruit
+STORE_FORMAT = 2
+
+
+def _year_dir(climatic_data_year):
+    return os.path.join(STORE_DIR, str(climatic_data_year))
+
+
+def _array_path(climatic_data_year, clim_year, series, year_dir=None):
+    return os.path.join(year_dir or _year_dir(climatic_data_year), str(clim_year), series + ".npy")
+
+
+def _marker_path(climatic_data_year, year_dir=None):
+    return os.path.join(year_dir or _year_dir(climatic_data_year), f"ingested.v{STORE_FORMAT}")
+
+
+def _write_year(climatic_data_year, year_dir):
+    # La demande sert de référence : les facteurs de charge sont réalignés sur
+    # ses dates (valeurs manquantes à 0, comme le reindex de prep_generators)
+    frames = {name: pd.read_csv(path.format(year=climatic_data_year), sep=";", index_col=1, parse_dates=True)
+              for name, path in SOURCES.items()}
+    demand = frames["demand"]
+
+    for clim_year, group in demand.groupby("climatic_year"):
+        os.makedirs(os.path.join(year_dir, str(clim_year)))
+        dates = group.index
+        np.save(_array_path(climatic_data_year, clim_year, "dates", year_dir), dates.values.astype("datetime64[ns]"))
+        series = {}
+        for name, frame in frames.items():
+            values = frame[frame["climatic_year"] == clim_year]["value"].reindex(dates, fill_value=0)
+            series[name] = values.to_numpy(dtype="float64")
+            np.save(_array_path(climatic_data_year, clim_year, name, year_dir), series[name])
+        np.save(_array_path(climatic_data_year, clim_year, "profiles", year_dir),
+                np.vstack([series[name] for name in PROFILE_SERIES]))
+
+    # marqueur écrit en dernier, une fois toutes les séries en place
+    with open(_marker_path(climatic_data_year, year_dir), "w") as f:
+        f.write(",".join(str(y) for y in sorted(demand["climatic_year"].unique())))
+
+
+@contextmanager
+def _install_lock(climatic_data_year, stale_after=60):
+    # verrou inter-processus portable (création exclusive d'un fichier), tenu le temps
+    # de vérifier puis remplacer l'année ; un verrou plus ancien que stale_after est abandonné
+    path = os.path.join(STORE_DIR, f".install-{climatic_data_year}.lock")
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale_after:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+def ingest_year(climatic_data_year):
+    # L'année est construite dans un répertoire temporaire propre à l'appelant, puis
+    # mise en place d'un seul renommage sous verrou : plusieurs workers peuvent ingérer
+    # la même année en même temps, un lecteur ne voit jamais une année incomplète
+    os.makedirs(STORE_DIR, exist_ok=True)
+    target = _year_dir(climatic_data_year)
+    staging = tempfile.mkdtemp(prefix=f".ingest-{climatic_data_year}-", dir=STORE_DIR)
+    try:
+        _write_year(climatic_data_year, staging)
+        with _install_lock(climatic_data_year):
+            if is_ingested(climatic_data_year):
+                # installée entre-temps par un autre processus : sa version est gardée
+                return
+            if os.path.exists(target):
+                # version périmée (CSV source modifié) mise de côté : les tableaux déjà
+                # mappés par d'autres processus restent lisibles
+                stale = tempfile.mkdtemp(prefix=f".stale-{climatic_data_year}-", dir=STORE_DIR)
+                os.replace(target, os.path.join(stale, "year"))
+                shutil.rmtree(stale, ignore_errors=True)
+            os.rename(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def is_ingested(climatic_data_year):
+    marker = _marker_path(climatic_data_year)
+    if not os.path.exists(marker):
+        return False
+    # le stock est périmé si un CSV source est plus récent
+    store_mtime = os.path.getmtime(marker)
+    return all(os.path.getmtime(path.format(year=climatic_data_year)) <= store_mtime
+               for path in SOURCES.values())
+
+
+def ensure_ingested(climatic_data_year):
+    if not is_ingested(climatic_data_year):
+        print("Conversion des séries " + str(climatic_data_year) + " au format binaire ...")
+        ingest_year(climatic_data_year)
+
+
+def climatic_years(climatic_data_year):
+    ensure_ingested(climatic_data_year)
+    return sorted(int(d) for d in os.listdir(_year_dir(climatic_data_year)) if d.isdigit())
+
+
+def load_dates(climatic_data_year, clim_year):
+    ensure_ingested(climatic_data_year)
+    path = _array_path(climatic_data_year, clim_year, "dates")
+    if not os.path.exists(path):
+        raise KeyError(clim_year)
+    return pd.DatetimeIndex(np.load(path, mmap_mode="r"), name="date")
+
+
+def load_window(series, climatic_data_year, clim_year, date_debut=0, time_horizon_in_hours=None):
+    # tranche [date_debut, date_debut + horizon) sans copie du tableau mappé
+    ensure_ingested(climatic_data_year)
+    path = _array_path(climatic_data_year, clim_year, series)
+    if not os.path.exists(path):
+        raise KeyError((series, clim_year))
+    values = np.load(path, mmap_mode="r")
+    if time_horizon_in_hours is None:
+        return values[date_debut:]
+    return values[date_debut:(date_debut + time_horizon_in_hours)]
+
+
+def load_profiles(climatic_data_year, clim_year):
+    # matrice (série de PROFILE_SERIES x pas de temps) en mémoire mappée, sans copie
+    return load_window("profiles", climatic_data_year, clim_year)
+
+
+def load_series(series, climatic_data_year, clim_year):
+    return pd.Series(load_window(series, climatic_data_year, clim_year),
+                     index=load_dates(climatic_data_year, clim_year), name="value", copy=False)
+
+
+if __name__ == "__main__":
+    years = [int(y) for y in sys.argv[1:]] or DATA_YEARS
+    for year in years:
+        print("Ingestion " + str(year) + " ...")
+        ingest_year(year)
+    print("Stock prêt dans " + STORE_DIR)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Réseau chargé sur toute l'année climatique, fenêtre simulée mobile.
+
+prep_network construit le réseau pour une fenêtre donnée : changer le mois de
+départ obligeait à relire les séries, recréer les snapshots et ré-ajouter
+tous les composants. WindowedNetwork construit le réseau une seule fois sur
+toute l'année et garde les profils complets (p_max_pu des filières variables,
+demande de référence). set_window ne fait ensuite que ré-indexer les
+snapshots et recopier les tranches correspondantes de ces tableaux : ni
+lecture disque, ni reconstruction des composants.
+
+Exemple :
+    windowed = WindowedNetwork(**params)
+    network = windowed.set_window(date_debut=2880, time_horizon_in_hours=168)
+"""
+from data_cache import get_dates
+from instrumentation import span
+from main import min_down_times, prep_network
+
+
+class WindowedNetwork:
+
+    def __init__(self, time_horizon_in_hours, date_debut, demand_multiplier, climatic_data_year, clim_year,
+                 capa_data_year, p_bat, capa_bat, p_hyd, capa_hyd, charge_initiale_stockage,
+                 commitment_window=None):
+        # commitment_window : fenêtre d'engagement fixe (horizon glissant),
+        # sinon les temps minimaux d'arrêt suivent la durée de la fenêtre
+        self.commitment_window = commitment_window
+        n_hours = len(get_dates(climatic_data_year, clim_year))
+        # demande de référence (multiplicateur 1), le multiplicateur est appliqué à chaque fenêtre
+        self.network = n = prep_network(n_hours, 0, 1.0, climatic_data_year, clim_year, capa_data_year,
+                                        p_bat, capa_bat, p_hyd, capa_hyd, charge_initiale_stockage,
+                                        commitment_window=commitment_window or time_horizon_in_hours)
+        self.snapshots = n.snapshots
+        self.p_max_pu = n.generators_t.p_max_pu
+        self.p_set = n.loads_t.p_set
+        self.date_debut, self.time_horizon_in_hours = 0, n_hours
+        self.demand_multiplier = 1.0
+        self.set_window(date_debut, time_horizon_in_hours, demand_multiplier)
+
+    @property
+    def base_load(self):
+        # demande de référence sur la fenêtre active
+        return self.p_set.iloc[self.date_debut:self.date_debut + self.time_horizon_in_hours]
+
+    def window(self, date_debut, time_horizon_in_hours):
+        # pas de temps [date_debut, date_debut + durée), tronqués en fin d'année comme dans prep_network
+        return self.snapshots[date_debut:date_debut + time_horizon_in_hours]
+
+    def set_window(self, date_debut, time_horizon_in_hours, demand_multiplier=None):
+        n = self.network
+        window = slice(date_debut, date_debut + time_horizon_in_hours)
+        snapshots = self.snapshots[window]
+        if not len(snapshots):
+            raise ValueError(f"Fenêtre vide : début {date_debut} h pour une année de {len(self.snapshots)} h")
+        if demand_multiplier is not None:
+            self.demand_multiplier = demand_multiplier
+
+        with span("window_update", hours=len(snapshots)):
+            resized = len(snapshots) != len(n.snapshots)
+            n.set_snapshots(snapshots)
+            n.generators_t.p_max_pu = self.p_max_pu.iloc[window]
+            n.loads_t.p_set = self.p_set.iloc[window]*self.demand_multiplier
+            if resized and self.commitment_window is None:
+                gens = n.generators
+                for carrier, value in min_down_times(len(snapshots)).items():
+                    gens.loc[gens.carrier == carrier, "min_down_time"] = value
+        self.date_debut, self.time_horizon_in_hours = date_debut, time_horizon_in_hours
+        return n